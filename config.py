@@ -1,3 +1,6 @@
+from pathlib import Path
+
+from pydantic import model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -6,9 +9,61 @@ class Settings(BaseSettings):
     LOGGING_LEVEL: str
     MAIN_ADMINS: list[int]
 
+    SEARCH_MODE: str = "search"
+    SCRAPER_WORKERS: int = 0
+
+    BOT_MODE: str = "polling"
+    UPDATES_IN_FLIGHT: int = 64
+    METRICS_PORT: int = 0
+    WEBHOOK_URL: str = ""
+    WEBHOOK_PATH: str = "/webhook"
+    WEBHOOK_SECRET: str = ""
+    WEBHOOK_HOST: str = "0.0.0.0"
+    WEBHOOK_PORT: int = 8080
+
+    NODE_ID: str = ""
+    FRONTEND_ONLY: bool = False
+    SHARD_COUNT: int = 64
+    LEASE_TTL: float = 30.0
+    LEASE_DB: str = "data_tasks/leases.db"
+    FILTERS_DB: str = "data_tasks/filters.db"
+
+    POLL_MIN_INTERVAL: float = 15.0
+    POLL_MAX_INTERVAL: float = 900.0
+    POLL_TARGET_HITS: float = 0.5
+
     model_config = SettingsConfigDict(env_file=".env")
 
 
+    @model_validator(mode="after")
+    def check_shared_paths(self) -> "Settings":
+        """
+        Узлы шардов и бот-фронтенд видят одни и те же фильтры и аренду только через
+        общие файлы, относительный путь у процессов с разным cwd разъедется молча
+        """
+
+        if self.NODE_ID and self.FRONTEND_ONLY:
+            raise ValueError("NODE_ID and FRONTEND_ONLY are mutually exclusive")
+
+        shared = {"LEASE_DB": self.LEASE_DB, "FILTERS_DB": self.FILTERS_DB} if self.NODE_ID else {}
+        if self.FRONTEND_ONLY:
+            shared["FILTERS_DB"] = self.FILTERS_DB
+
+        for name, path in shared.items():
+            if not Path(path).is_absolute():
+                raise ValueError(f"{name} must be an absolute path on a shared volume when NODE_ID or FRONTEND_ONLY is set")
+
+        return self
+
+
+    def node_path(self, name: str) -> str:
+        """
+        Локальное состояние узла (outbox, seen, кэш фото) у каждого NODE_ID своё
+        """
+
+        return f"data_tasks/nodes/{self.NODE_ID}/{name}" if self.NODE_ID else f"data_tasks/{name}"
+
+
 settings = Settings()
 
 
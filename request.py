@@ -1,16 +1,227 @@
+import json
+import asyncio
+import hashlib
+import logging
 import aiohttp
 from asyncio import run
+from dataclasses import dataclass, field, asdict
+from urllib.parse import urljoin
 from bs4 import BeautifulSoup as bs
 
+from src.utils.session import http_pool
+from src.engine.catalog import cached
+
 
 BASE_URL = "https://www.ss.com/en/transport/cars/"
 
 
 async def fetch_soup(url: str) -> bs | None:
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as resp:
-            html = await resp.text()
-            return bs(html, "lxml") if html else None
+    async with http_pool.get().get(url) as resp:
+        html = await resp.text()
+        return bs(html, "lxml") if html else None
+
+
+SEARCH_FIELDS = {
+    "models": "cid[]",
+    "min_year": "topt[18][min]",
+    "max_year": "topt[18][max]",
+    "min_displacement": "topt[15][min]",
+    "max_displacement": "topt[15][max]",
+    "typengines": "opt[34][]",
+    "gearbox": "opt[35][]",
+    "bodytypes": "opt[32][]",
+    "inspection": "opt[223][]",
+    "min_price": "topt[8][min]",
+    "max_price": "topt[8][max]",
+}
+
+def filter_fingerprint(info: dict) -> str:
+    """
+    Канонический отпечаток запроса: одинаковые фильтры разных пользователей
+    дают одну и ту же строку
+    """
+
+    canonical = {"url": info.get("url")}
+    for field in SEARCH_FIELDS:
+        value = info.get(field)
+        if value in (None, "", []):
+            continue
+        canonical[field] = sorted(str(v) for v in value) if isinstance(value, list) else [str(value)]
+
+    raw = json.dumps(canonical, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+MODEL_SKIP = {"All", "Another", "Car rent", "Spare parts", "Car exchange"}
+GROUP_SKIP = MODEL_SKIP | {"Citan", "Sprinter", "Vaneo", "Viano", "Vito"}
+
+
+@dataclass
+class SearchForm:
+    """
+    Всё, что есть в форме поиска марки, из одной загрузки /search/:
+    списки опций для мастера и label→value карты select'ов для запроса
+    """
+
+    url: str
+    action: str
+    method: str
+    hidden: list[tuple[str, str]]
+    selects: dict[str, dict[str, str]]
+    models: list[str] = field(default_factory=list)
+    model_groups: dict[str, list[str]] = field(default_factory=dict)
+    years: list[str] = field(default_factory=list)
+    displacements: list[str] = field(default_factory=list)
+    typengines: list[str] = field(default_factory=list)
+    gearbox: list[str] = field(default_factory=list)
+    bodytypes: list[str] = field(default_factory=list)
+    inspection: list[str] = field(default_factory=list)
+
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SearchForm":
+        return cls(**{**data, "hidden": [tuple(item) for item in data["hidden"]]})
+
+
+def brand_url(url: str) -> str:
+    return url[:-len("search/")] if url.endswith("search/") else url
+
+
+def parse_model_groups(select) -> dict[str, list[str]]:
+    result, current = {}, None
+
+    for opt in select.select("option"):
+        text = opt.text.strip()
+
+        if "font-weight:bold" in opt.get("style", "").replace(" ", ""):
+            current = text
+            result[current] = []
+            continue
+
+        if text in GROUP_SKIP or not current:
+            continue
+
+        result[current].append(text)
+
+    return result
+
+
+def parse_search_form(soup, url: str) -> SearchForm | None:
+    form = soup.select_one("form#filter_frm") or next((f for f in soup.select("form") if f.select_one("#sbtn")), None)
+    if not form:
+        return None
+
+    selects = {}
+    for select in form.select("select[name]"):
+        selects[select["name"]] = {opt.text.strip(): opt.get("value", "") for opt in select.select("option")}
+
+    models_select = form.select_one("select[name='cid[]']")
+
+    return SearchForm(
+        url=url,
+        action=urljoin(url, form.get("action") or url),
+        method=(form.get("method") or "get").lower(),
+        hidden=[(i["name"], i.get("value", "")) for i in form.select("input[type='hidden'][name]")],
+        selects=selects,
+        models=extract_options(form, "select[name='cid[]'] option", exclude_text=list(MODEL_SKIP)),
+        model_groups=parse_model_groups(models_select) if models_select else {},
+        years=extract_options(form, "select[name='topt[18][min]'] option", value_filter=lambda v: v.isdigit() and int(v) >= 1960, reverse=True),
+        displacements=extract_options(form, "select[name='topt[15][max]'] option"),
+        typengines=extract_options(form, "select[name='opt[34][]'] option", exclude_value=[""]),
+        gearbox=extract_options(form, "select[name='opt[35][]'] option"),
+        bodytypes=extract_options(form, "select[name='opt[32][]'] option", exclude_text=["-"], exclude_value=[""]),
+        inspection=extract_options(form, "select[name='opt[223][]'] option", value_filter=lambda v: not v.isdigit()),
+    )
+
+
+async def fetch_search_form(url: str) -> SearchForm | None:
+    soup = await fetch_soup(brand_url(url) + "search/")
+    return parse_search_form(soup, brand_url(url) + "search/") if soup else None
+
+
+@cached("search_form")
+async def _search_form_data(url: str) -> dict:
+    form = await fetch_search_form(url)
+    return asdict(form) if form else {}
+
+
+async def load_search_form(url: str) -> SearchForm | None:
+    """
+    Форма поиска марки для шагов мастера: одна загрузка на марку, дальше из каталога
+    """
+
+    data = await _search_form_data(url=brand_url(url))
+    return SearchForm.from_dict(data) if data else None
+
+
+async def prefetch_brand(url: str, groups: bool = False) -> None:
+    """
+    Прогрев каталога для всех следующих шагов мастера по выбранной марке
+    """
+
+    jobs = [load_search_form(url)]
+    if groups:
+        jobs.append(get_models(url=url))
+
+    for result in await asyncio.gather(*jobs, return_exceptions=True):
+        if isinstance(result, Exception):
+            logging.warning(f"[Catalog] Прогрев {url} не удался: {result}")
+
+
+def build_search_query(info: dict, form: SearchForm) -> list[tuple[str, str]]:
+    params = list(form.hidden)
+    selects = form.selects
+
+    for field, name in SEARCH_FIELDS.items():
+        value = info.get(field)
+        if value in (None, "", []):
+            continue
+
+        values = value if isinstance(value, list) else [value]
+        if name in selects:
+            labels = selects[name]
+            params.extend((name, labels[str(v)]) for v in values if str(v) in labels)
+        else:
+            params.append((name, str(values[0])))
+
+    sid = selects.get("sid", {}).get("Sell")
+    if sid is not None:
+        params.append(("sid", sid))
+
+    return params
+
+
+async def search_ads(info: dict) -> list[tuple[str, str]] | None:
+    """
+    Поиск по фильтру обычным HTTP-запросом. None — если запрос не удался
+    и нужно идти через браузер.
+    """
+
+    try:
+        form = await load_search_form(info["url"])
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        return None
+    if not form:
+        return None
+
+    params = build_search_query(info, form)
+
+    try:
+        async with http_pool.isolated() as session:
+            if form.method == "post":
+                request = session.post(form.action, data=params, timeout=aiohttp.ClientTimeout(total=15))
+            else:
+                request = session.get(form.action, params=params, timeout=aiohttp.ClientTimeout(total=15))
+
+            async with request as resp:
+                if resp.status != 200:
+                    return None
+                html = await resp.text()
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        return None
+
+    soup = bs(html, "lxml")
+    return [(a.get_text(strip=True), a.get("href")) for a in soup.select("a.am")]
 
 
 def extract_options(soup, selector: str, *, 
@@ -40,6 +251,7 @@ def extract_options(soup, selector: str, *,
     return sorted(result, reverse=reverse) if sort else result
 
 
+@cached("brands")
 async def get_list_cars() -> list[dict]:
     excluded_brands = {
         "Electric cars", "Exclusive cars", "Retro cars", "Sport cars", "Tuned cars",
@@ -57,35 +269,50 @@ async def get_list_cars() -> list[dict]:
 
 
 async def get_models_cars(url: str) -> list[str]:
-    return extract_options(await fetch_soup(url), "select[name='cid[]'] option", exclude_text=["All","Another","Car rent","Spare parts","Car exchange"])
+    form = await load_search_form(url)
+    return form.models if form else []
 
 
 async def get_years(url: str) -> list[str]:
-    return extract_options(await fetch_soup(url), "select[name='topt[18][min]'] option", value_filter=lambda v: v.isdigit() and int(v) >= 1960, reverse=True)
+    form = await load_search_form(url)
+    return form.years if form else []
 
 
 async def get_displacement_motor(url: str) -> list[str]:
-    return extract_options(await fetch_soup(url), "select[name='topt[15][max]'] option")
+    form = await load_search_form(url)
+    return form.displacements if form else []
 
 
 async def get_typengines(url: str) -> list[str]:
-    soup = await fetch_soup(url)
-    return extract_options(soup, "select[name='opt[34][]'] option", exclude_value=[''])
+    form = await load_search_form(url)
+    return form.typengines if form else []
 
 
 async def get_gearbox(url: str) -> list[str]:
-    return extract_options(await fetch_soup(url), "select[name='opt[35][]'] option")
+    form = await load_search_form(url)
+    return form.gearbox if form else []
 
 
 async def get_bodytype(url: str) -> list[str]:
-    return extract_options(await fetch_soup(url), "select[name='opt[32][]'] option", exclude_text=["-"], exclude_value=[""])
+    form = await load_search_form(url)
+    return form.bodytypes if form else []
 
 
 async def get_inspection(url: str) -> list[str]:
-    return extract_options(await fetch_soup(url), "select[name='opt[223][]'] option", value_filter=lambda v: not v.isdigit())
+    form = await load_search_form(url)
+    return form.inspection if form else []
 
 
 async def get_models(url: str) -> dict[str, list[str]]:
+    form = await load_search_form(url)
+    if form and form.model_groups:
+        return form.model_groups
+
+    return await _get_models_page(url=brand_url(url))
+
+
+@cached("model_groups")
+async def _get_models_page(url: str) -> dict[str, list[str]]:
     soup = await fetch_soup(url)
     if not soup:
         return {}
@@ -98,23 +325,7 @@ async def get_models(url: str) -> dict[str, list[str]]:
     if not select:
         return {}
 
-    skip = {"All", "Another", "Car rent", "Spare parts", "Car exchange", "Citan", "Sprinter", "Vaneo", "Viano", "Vito"}
-    result, current = {}, None
-
-    for opt in select.select("option"):
-        text = opt.text.strip()
-
-        if "font-weight:bold" in opt.get("style", "").replace(" ", ""):
-            current = text
-            result[current] = []
-            continue
-
-        if text in skip or not current:
-            continue
-
-        result[current].append(text)
-
-    return result
+    return parse_model_groups(select)
 
 
 # async def main():
@@ -0,0 +1,10 @@
+from asyncio import run
+from src.core.node import ScraperNode
+
+
+if __name__ == '__main__':
+    node = ScraperNode()
+
+    try:
+        run(node.run())
+    except KeyboardInterrupt: pass
@@ -3,10 +3,11 @@ from aiogram.enums import ParseMode
 from aiogram.client.default import DefaultBotProperties
 
 from config import settings
+from .middlewares import ChatEventIsolation
 
 
 class SettingsBot:
     def __init__(self, token: str) -> None:
         self.bot = Bot(token=token, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
-        self.dp = Dispatcher()
+        self.dp = Dispatcher(events_isolation=ChatEventIsolation())
         self.config = settings
@@ -0,0 +1,114 @@
+import time
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncGenerator, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.fsm.storage.base import BaseEventIsolation, StorageKey
+from aiogram.types import TelegramObject
+
+from src.utils.metrics import registry
+
+
+queued_at: ContextVar[float | None] = ContextVar("queued_at", default=None)
+
+
+class ChatEventIsolation(BaseEventIsolation):
+    """
+    Апдейты одного чата обрабатываются строго по очереди (FSM зависит от порядка).
+    Dispatcher берёт этот lock до чтения состояния, так что следующий апдейт чата
+    маршрутизируется уже по состоянию, которое оставил предыдущий.
+    Lock'и без ожидающих удаляются. Момент постановки в очередь чата кладётся
+    в queued_at, чтобы ожидание за lock'ом тоже попадало в метрики.
+    """
+
+    def __init__(self) -> None:
+        self.locks: dict[tuple[int, int], tuple[asyncio.Lock, int]] = {}
+
+
+    @asynccontextmanager
+    async def lock(self, key: StorageKey) -> AsyncGenerator[None, None]:
+        chat = (key.bot_id, key.chat_id)
+        lock, users = self.locks.get(chat, (None, 0))
+        if lock is None:
+            lock = asyncio.Lock()
+        self.locks[chat] = (lock, users + 1)
+        token = queued_at.set(time.monotonic())
+
+        try:
+            async with lock:
+                yield
+        finally:
+            queued_at.reset(token)
+            lock, users = self.locks[chat]
+            if users <= 1:
+                del self.locks[chat]
+            else:
+                self.locks[chat] = (lock, users - 1)
+
+
+    async def close(self) -> None:
+        self.locks.clear()
+
+
+class OrderedUpdatesMiddleware(BaseMiddleware):
+    """
+    Апдейты разных чатов обрабатываются параллельно, порядок внутри чата держит
+    ChatEventIsolation диспетчера. Общее число одновременно обрабатываемых
+    апдейтов ограничено max_in_flight; в метрики попадает всё ожидание апдейта:
+    за lock'ом своего чата и за слотом.
+    """
+
+    def __init__(self, max_in_flight: int = 64) -> None:
+        self.max_in_flight = max_in_flight
+        self.slots = asyncio.Semaphore(max_in_flight)
+
+        self.in_flight = 0
+        self.stats = {"processed": 0, "failed": 0, "waited": 0}
+        self.waits = deque(maxlen=1000)
+
+        registry.lazy("updates_in_flight", "Telegram updates being handled", lambda: self.in_flight)
+        registry.lazy(
+            "updates_total", "Telegram updates by outcome",
+            lambda: {(event,): value for event, value in self.stats.items()},
+            kind="counter", labels=("event",)
+        )
+        registry.lazy("update_wait_p95_seconds", "p95 of update queue wait", lambda: self.get_metrics()["wait_p95"])
+
+
+    async def __call__(self, handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject, data: dict[str, Any]) -> Any:
+        started = queued_at.get() or time.monotonic()
+
+        async with self.slots:
+            return await self._handle(handler, event, data, started)
+
+
+    async def _handle(self, handler, event, data, started: float) -> Any:
+        wait = time.monotonic() - started
+        self.waits.append(wait)
+        if wait > 0.001:
+            self.stats["waited"] += 1
+
+        self.in_flight += 1
+        try:
+            return await handler(event, data)
+        except Exception:
+            self.stats["failed"] += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            self.stats["processed"] += 1
+
+
+    def get_metrics(self) -> dict:
+        waits = sorted(self.waits)
+
+        return {
+            **self.stats,
+            "in_flight": self.in_flight,
+            "wait_avg": round(sum(waits) / len(waits), 4) if waits else 0.0,
+            "wait_p95": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 4) if waits else 0.0,
+        }
@@ -0,0 +1,48 @@
+import signal
+import asyncio
+from loguru import logger
+
+from config import settings
+from src.utils.loguru import setup_logging
+
+from manager import thread_manager
+from src.utils.metrics import registry
+
+
+class ScraperNode:
+    """
+    Узел только со скрапером: без Dispatcher'а, getUpdates и webhook, поэтому
+    таких узлов на одном токене может быть сколько угодно. Фильтры своих шардов
+    узел берёт из общего FilterSource, уведомления отправляет сам через Bot API.
+    """
+
+    def __init__(self) -> None:
+        setup_logging()
+        self.stop_event = None
+
+
+    def stop(self) -> None:
+        if self.stop_event:
+            self.stop_event.set()
+
+
+    async def run(self) -> None:
+        if not settings.NODE_ID:
+            raise RuntimeError("NODE_ID is required to run a scraper node")
+
+        self.stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self.stop)
+
+        if settings.METRICS_PORT:
+            registry.serve(settings.METRICS_PORT)
+
+        thread_manager.restart_threads()
+        logger.info(f"Scraper node {settings.NODE_ID} started")
+
+        try:
+            await self.stop_event.wait()
+        finally:
+            await asyncio.to_thread(thread_manager.stop)
+            logger.info(f"Scraper node {settings.NODE_ID} stopped")
@@ -3,10 +3,16 @@ from loguru import logger
 
 from config import settings
 from .bot import SettingsBot
+from .webhook import WebhookServer
+from .middlewares import OrderedUpdatesMiddleware
 from src.handlers import register_handlers
 from src.utils.loguru import setup_logging
 
 from manager import thread_manager
+from src.utils.session import http_pool
+from src.database.repository import filter_repository
+from src.engine.catalog import catalog
+from src.utils.metrics import registry
 
 
 class BotRunner:
@@ -14,6 +20,8 @@ class BotRunner:
         setup_logging()
         self.module = SettingsBot(token=settings.TOKEN)
         self.dp = self.module.dp
+        self.updates = OrderedUpdatesMiddleware(max_in_flight=settings.UPDATES_IN_FLIGHT)
+        self.dp.update.outer_middleware(self.updates)
 
 
     async def setup_handlers(self) -> None:
@@ -22,11 +30,30 @@ class BotRunner:
 
     async def start(self) -> None:
         try:
-            await self.dp.start_polling(self.module.bot)
+            if settings.BOT_MODE == "webhook":
+                await WebhookServer(self.module).run()
+            else:
+                await self.dp.start_polling(self.module.bot, tasks_concurrency_limit=settings.UPDATES_IN_FLIGHT)
         except Exception as e: logger.error(f"Bot crashed: {e}")
 
 
     async def run(self) -> None:
-        # thread_manager.restart_threads()
+        thread_manager.start()
+        if settings.NODE_ID:
+            thread_manager.restart_threads()
+        if settings.METRICS_PORT:
+            registry.serve(settings.METRICS_PORT)
+
+        await asyncio.to_thread(filter_repository.load)
+        await asyncio.to_thread(catalog.load)
         await self.setup_handlers()
-        await self.start()
+        flusher = asyncio.create_task(filter_repository.run())
+
+        try:
+            await self.start()
+        finally:
+            thread_manager.stop()
+            flusher.cancel()
+            await asyncio.gather(flusher, return_exceptions=True)
+            await catalog.save()
+            await http_pool.close()
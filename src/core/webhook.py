@@ -0,0 +1,106 @@
+import asyncio
+import signal
+from loguru import logger
+
+from aiohttp import web
+from aiogram.types import Update
+
+from config import settings
+from .bot import SettingsBot
+
+
+class WebhookServer:
+    """
+    Приём апдейтов по webhook на встроенном aiohttp-сервере.
+    Каждый апдейт обрабатывается своей задачей, ответ Telegram уходит сразу.
+    При остановке новые апдейты получают 503 (Telegram их повторит),
+    а уже принятые дорабатываются в пределах drain_timeout.
+    """
+
+    def __init__(self, module: SettingsBot, drain_timeout: float = 30.0) -> None:
+        self.bot = module.bot
+        self.dp = module.dp
+        self.drain_timeout = drain_timeout
+
+        self.draining = False
+        self._tasks: set[asyncio.Task] = set()
+        self._stop = None
+
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(settings.WEBHOOK_PATH, self.handle)
+        return app
+
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if settings.WEBHOOK_SECRET and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != settings.WEBHOOK_SECRET:
+            return web.Response(status=401)
+
+        if self.draining:
+            return web.Response(status=503)
+
+        try:
+            update = Update.model_validate(await request.json(), context={"bot": self.bot})
+        except ValueError as e:
+            logger.warning(f"Bad update: {e}")
+            return web.Response(status=400)
+
+        task = asyncio.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+        return web.Response()
+
+
+    async def _process(self, update: Update) -> None:
+        try:
+            await self.dp.feed_update(self.bot, update)
+        except Exception as e:
+            logger.error(f"Update {update.update_id} failed: {e}")
+
+
+    async def drain(self) -> None:
+        self.draining = True
+        if not self._tasks:
+            return
+
+        logger.info(f"Draining {len(self._tasks)} updates")
+        done, pending = await asyncio.wait(set(self._tasks), timeout=self.drain_timeout)
+        for task in pending:
+            task.cancel()
+
+
+    async def run(self) -> None:
+        self._stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self._stop.set)
+            except (NotImplementedError, RuntimeError):
+                pass
+
+        runner = web.AppRunner(self.make_app())
+        await runner.setup()
+        site = web.TCPSite(runner, settings.WEBHOOK_HOST, settings.WEBHOOK_PORT)
+
+        await self.dp.emit_startup(bot=self.bot)
+        try:
+            await site.start()
+
+            if settings.WEBHOOK_URL:
+                await self.bot.set_webhook(
+                    url=settings.WEBHOOK_URL.rstrip("/") + settings.WEBHOOK_PATH,
+                    secret_token=settings.WEBHOOK_SECRET or None,
+                    allowed_updates=self.dp.resolve_used_update_types(),
+                )
+            else:
+                logger.warning("WEBHOOK_URL is empty, webhook is not registered (local mode)")
+
+            logger.info(f"Webhook server on {settings.WEBHOOK_HOST}:{settings.WEBHOOK_PORT}{settings.WEBHOOK_PATH}")
+            await self._stop.wait()
+        finally:
+            await self.drain()
+            await runner.cleanup()
+            await self.dp.emit_shutdown(bot=self.bot)
+            await self.bot.session.close()
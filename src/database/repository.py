@@ -0,0 +1,178 @@
+import asyncio
+import copy
+import logging
+import threading
+import uuid
+
+from src.database.store import FilterStore, filter_store
+
+
+class FilterRepository:
+    """
+    Все фильтры в памяти с индексами по uid и id: чтение из обработчиков без I/O.
+    Изменения копятся по id (побеждает последнее) и пишутся в FilterStore пачкой,
+    одной транзакцией, в фоне раз в flush_interval и при остановке.
+    """
+
+    def __init__(self, store: FilterStore, flush_interval: float = 0.5) -> None:
+        self.store = store
+        self.flush_interval = flush_interval
+
+        self.lock = threading.RLock()
+        self.filters: dict[str, dict] = {}
+        self.owners: dict[str, int] = {}
+        self.uids: dict[int, dict[str, None]] = {}
+        self.active_ids: set[str] = set()
+        self._dirty: dict[str, tuple[int, dict, bool] | None] = {}
+        self._loaded = False
+        self._flush_now = None
+
+
+    def load(self) -> None:
+        with self.lock:
+            if self._loaded:
+                return
+
+            for filter_id, uid, data, active in self.store.load_all():
+                self._put(filter_id, uid, data)
+                if active:
+                    self.active_ids.add(filter_id)
+
+            self._loaded = True
+
+
+    def _put(self, filter_id: str, uid: int, data: dict) -> None:
+        self.filters[filter_id] = data
+        self.owners[filter_id] = uid
+        self.uids.setdefault(uid, {})[filter_id] = None
+
+
+    def _mark(self, filter_id: str) -> None:
+        if filter_id in self.filters:
+            self._dirty[filter_id] = (self.owners[filter_id], copy.deepcopy(self.filters[filter_id]), filter_id in self.active_ids)
+        else:
+            self._dirty[filter_id] = None
+
+        if self._flush_now and len(self._dirty) >= 500:
+            self._flush_now.set()
+
+
+    def get(self, filter_id: str) -> dict | None:
+        with self.lock:
+            self.load()
+            data = self.filters.get(filter_id)
+            return copy.deepcopy(data) if data is not None else None
+
+
+    def by_uid(self, uid: int) -> dict[str, dict]:
+        with self.lock:
+            self.load()
+            return {filter_id: copy.deepcopy(self.filters[filter_id]) for filter_id in self.uids.get(uid, {})}
+
+
+    def active(self) -> dict[int, dict[str, dict]]:
+        with self.lock:
+            self.load()
+            result = {}
+            for filter_id in self.active_ids:
+                result.setdefault(self.owners[filter_id], {})[filter_id] = copy.deepcopy(self.filters[filter_id])
+            return result
+
+
+    def create(self, uid: int, data: dict) -> str:
+        filter_id = str(uuid.uuid4())
+
+        with self.lock:
+            self.load()
+            self._put(filter_id, uid, copy.deepcopy(data))
+            self._mark(filter_id)
+
+        return filter_id
+
+
+    def update(self, filter_id: str, new_data: dict) -> dict | None:
+        with self.lock:
+            self.load()
+            record = self.filters.get(filter_id)
+            if record is None:
+                return None
+
+            for k, v in new_data.items():
+                if v in (None, "", 0):
+                    record.pop(k, None)
+                else:
+                    record[k] = copy.deepcopy(v)
+
+            self._mark(filter_id)
+            return copy.deepcopy(record)
+
+
+    def delete(self, filter_id: str) -> bool:
+        with self.lock:
+            self.load()
+            if filter_id not in self.filters:
+                return False
+
+            del self.filters[filter_id]
+            uid = self.owners.pop(filter_id)
+            self.uids.get(uid, {}).pop(filter_id, None)
+            if not self.uids.get(uid):
+                self.uids.pop(uid, None)
+            self.active_ids.discard(filter_id)
+            self._mark(filter_id)
+
+        return True
+
+
+    def activate(self, uid: int, filter_ids) -> None:
+        with self.lock:
+            self.load()
+            for filter_id in filter_ids:
+                if filter_id in self.filters and filter_id not in self.active_ids:
+                    self.active_ids.add(filter_id)
+                    self._mark(filter_id)
+
+
+    def deactivate(self, filter_id: str) -> None:
+        with self.lock:
+            self.load()
+            if filter_id in self.active_ids:
+                self.active_ids.discard(filter_id)
+                self._mark(filter_id)
+
+
+    async def flush(self) -> None:
+        with self.lock:
+            ops, self._dirty = self._dirty, {}
+
+        if not ops:
+            return
+
+        try:
+            await asyncio.to_thread(self.store.apply, ops)
+        except Exception:
+            with self.lock:
+                self._dirty = {**ops, **self._dirty}
+            raise
+
+
+    async def run(self) -> None:
+        self._flush_now = asyncio.Event()
+
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(self._flush_now.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+                self._flush_now.clear()
+                try:
+                    await self.flush()
+                except Exception as e:
+                    logging.error(f"[FilterRepository] Ошибка записи: {e}", exc_info=True)
+        finally:
+            await self.flush()
+
+
+filter_repository = FilterRepository(store=filter_store)
@@ -0,0 +1,147 @@
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from config import settings
+
+
+class FilterStore:
+    """
+    Фильтры пользователей в SQLite вместо data_tasks/cars.json и active_threads.json.
+    Индексы по uid и id фильтра, связанные изменения обеих таблиц идут одной транзакцией.
+    """
+
+    def __init__(self, path: str = "data_tasks/filters.db",
+                 cars_path: str = "data_tasks/cars.json",
+                 threads_path: str = "data_tasks/active_threads.json") -> None:
+        self.path = Path(path)
+        self.cars_path = Path(cars_path)
+        self.threads_path = Path(threads_path)
+        self.lock = threading.RLock()
+        self._conn = None
+
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("PRAGMA foreign_keys=ON")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS filters (
+                    id TEXT PRIMARY KEY,
+                    uid INTEGER NOT NULL,
+                    data TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    updated REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS filters_uid ON filters (uid);
+                CREATE TABLE IF NOT EXISTS active_filters (
+                    filter_id TEXT PRIMARY KEY REFERENCES filters (id) ON DELETE CASCADE,
+                    uid INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS active_filters_uid ON active_filters (uid);
+            """)
+            self._migrate_json()
+        return self._conn
+
+
+    @staticmethod
+    def _read_json(path: Path) -> dict:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f) or {}
+        except (FileNotFoundError, json.JSONDecodeError): return {}
+
+
+    def _migrate_json(self) -> None:
+        conn = self._conn
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'json_migrated'").fetchone():
+            return
+
+        cars = self._read_json(self.cars_path)
+        threads = self._read_json(self.threads_path)
+        now = time.time()
+
+        with conn:
+            for filter_id, data in cars.items():
+                conn.execute(
+                    "INSERT OR IGNORE INTO filters (id, uid, data, created, updated) VALUES (?, ?, ?, ?, ?)",
+                    (filter_id, int(data.get("uid", 0)), json.dumps(data, ensure_ascii=False), now, now)
+                )
+
+            for uid, entries in threads.items():
+                for entry in entries:
+                    for filter_id in entry:
+                        if filter_id in cars:
+                            conn.execute("INSERT OR IGNORE INTO active_filters (filter_id, uid) VALUES (?, ?)", (filter_id, int(uid)))
+
+            conn.execute("INSERT INTO meta (key, value) VALUES ('json_migrated', ?)", (str(now),))
+
+
+    def active(self) -> dict[int, dict[str, dict]]:
+        with self.lock:
+            rows = self._connect().execute("""
+                SELECT a.uid, f.id, f.data FROM active_filters a JOIN filters f ON f.id = a.filter_id
+            """).fetchall()
+
+        result = {}
+        for uid, filter_id, data in rows:
+            result.setdefault(uid, {})[filter_id] = json.loads(data)
+        return result
+
+
+    def load_all(self) -> list[tuple[str, int, dict, bool]]:
+        with self.lock:
+            rows = self._connect().execute("""
+                SELECT f.id, f.uid, f.data, a.filter_id IS NOT NULL
+                FROM filters f LEFT JOIN active_filters a ON a.filter_id = f.id
+                ORDER BY f.created
+            """).fetchall()
+
+        return [(filter_id, uid, json.loads(data), bool(active)) for filter_id, uid, data, active in rows]
+
+
+    def apply(self, ops: dict[str, tuple[int, dict, bool] | None]) -> None:
+        """
+        Пачка изменений одной транзакцией: id -> (uid, data, active) или None для удаления
+        """
+
+        now = time.time()
+
+        with self.lock:
+            conn = self._connect()
+            with conn:
+                for filter_id, op in ops.items():
+                    if op is None:
+                        conn.execute("DELETE FROM active_filters WHERE filter_id = ?", (filter_id,))
+                        conn.execute("DELETE FROM filters WHERE id = ?", (filter_id,))
+                        continue
+
+                    uid, data, active = op
+                    conn.execute("""
+                        INSERT INTO filters (id, uid, data, created, updated) VALUES (?, ?, ?, ?, ?)
+                        ON CONFLICT (id) DO UPDATE SET uid = excluded.uid, data = excluded.data, updated = excluded.updated
+                    """, (filter_id, uid, json.dumps(data, ensure_ascii=False), now, now))
+
+                    if active:
+                        conn.execute("INSERT OR IGNORE INTO active_filters (filter_id, uid) VALUES (?, ?)", (filter_id, uid))
+                    else:
+                        conn.execute("DELETE FROM active_filters WHERE filter_id = ?", (filter_id,))
+
+
+    def close(self) -> None:
+        with self.lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+filter_store = FilterStore(path=settings.FILTERS_DB)
@@ -0,0 +1,161 @@
+import copy
+import json
+import asyncio
+import functools
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+import aiofiles
+
+
+class CatalogCache:
+    """
+    Справочники ss.com (марки, модели, опции формы поиска) по ключу kind|url.
+    Свежая запись отдаётся из памяти, устаревшая — тоже из памяти, но с фоновым
+    обновлением (stale-while-revalidate). Снимок лежит на диске и читается при старте.
+    Кэшем пользуются и бот, и движок поиска из своих loop'ов: одновременные
+    загрузки одного ключа склеиваются в пределах loop'а.
+    """
+
+    def __init__(self, path: str = "data_tasks/catalog.json", ttl: float = 6 * 3600,
+                 max_stale: float = 7 * 24 * 3600, save_delay: float = 5.0) -> None:
+        self.path = Path(path)
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.save_delay = save_delay
+
+        self.entries: dict[str, tuple[float, object]] = {}
+        self.version = 0
+        self._loaded = False
+        self._inflight: dict[tuple[asyncio.AbstractEventLoop, str], asyncio.Future] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self._save_handle = None
+        self.stats = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "errors": 0}
+
+
+    def load(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                raw = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logging.warning(f"[Catalog] Снимок не прочитан: {e}")
+            return
+
+        self.entries = {key: (fetched, value) for key, (fetched, value) in raw.items()}
+        self.version += 1
+        logging.info(f"[Catalog] Загружено из снимка: {len(self.entries)}")
+
+
+    async def get(self, key: str, loader):
+        self.load()
+        entry = self.entries.get(key)
+        age = time.time() - entry[0] if entry else None
+
+        if entry and age < self.ttl:
+            self.stats["hits"] += 1
+            return copy.deepcopy(entry[1])
+
+        if entry and age < self.max_stale:
+            self.stats["stale_hits"] += 1
+            if (asyncio.get_running_loop(), key) not in self._inflight:
+                task = asyncio.create_task(self._refresh(key, loader))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+            return copy.deepcopy(entry[1])
+
+        self.stats["misses"] += 1
+        return copy.deepcopy(await self._fetch(key, loader))
+
+
+    async def _fetch(self, key: str, loader):
+        loop = asyncio.get_running_loop()
+        inflight = (loop, key)
+        if inflight in self._inflight:
+            return await asyncio.shield(self._inflight[inflight])
+
+        future = loop.create_future()
+        self._inflight[inflight] = future
+
+        try:
+            value = await loader()
+            if value:
+                previous = self.entries.get(key)
+                self.entries[key] = (time.time(), value)
+                if previous is not None and previous[1] != value:
+                    self.version += 1
+                self._schedule_save()
+            elif key in self.entries:
+                value = self.entries[key][1]
+            future.set_result(value)
+            return value
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            del self._inflight[inflight]
+
+
+    async def _refresh(self, key: str, loader) -> None:
+        self.stats["refreshes"] += 1
+        try:
+            await self._fetch(key, loader)
+        except Exception as e:
+            self.stats["errors"] += 1
+            logging.warning(f"[Catalog] Не удалось обновить {key}: {e}")
+
+
+    def _schedule_save(self) -> None:
+        if self._save_handle is None:
+            self._save_handle = asyncio.get_running_loop().call_later(self.save_delay, self._spawn_save)
+
+
+    def _spawn_save(self) -> None:
+        self._save_handle = None
+        task = asyncio.create_task(self.save())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+
+    async def save(self) -> None:
+        if not self.entries:
+            return
+
+        if self._save_handle is not None:
+            self._save_handle.cancel()
+            self._save_handle = None
+
+        tmp = self.path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            async with aiofiles.open(tmp, "w", encoding="utf-8") as f:
+                await f.write(json.dumps(self.entries, ensure_ascii=False))
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logging.warning(f"[Catalog] Снимок не записан: {e}")
+
+
+def cached(kind: str):
+    """
+    Ответ справочной функции request.py кэшируется по kind и аргументам
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            key = "|".join([kind, *map(str, args), *map(str, kwargs.values())])
+            return await catalog.get(key, lambda: func(*args, **kwargs))
+        return wrapper
+    return decorator
+
+
+catalog = CatalogCache()
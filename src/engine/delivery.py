@@ -0,0 +1,425 @@
+import json
+import asyncio
+import logging
+import time
+from collections import deque
+
+import aiohttp
+
+from config import settings
+from src.utils.session import http_pool
+from src.engine.photos import photo_cache
+from src.engine.outbox import outbox
+from src.utils.metrics import registry
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+
+    def wait_time(self) -> float:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+
+    def consume(self) -> None:
+        self.tokens -= 1
+
+
+class DeliveryService:
+    """
+    Одна очередь отправки в Telegram на весь процесс.
+    Глобальный token bucket (~30 msg/s), bucket на каждый чат (~1 msg/s),
+    пауза по retry_after при 429 и ограниченный backlog.
+    Объявления, пришедшие в один чат в пределах album_window, уходят альбомом до 10 штук.
+    Запись в outbox подтверждается только после отправки или постоянной ошибки (400/403),
+    остальные ошибки возвращают сообщения в очередь чата с экспоненциальной паузой.
+    """
+
+    def __init__(self, global_rate: float = 30.0, chat_rate: float = 1.0,
+                 max_backlog: int = 10000, concurrency: int = 10,
+                 album_window: float = 1.5, album_size: int = 10,
+                 retry_base: float = 2.0, retry_max: float = 300.0) -> None:
+        self.global_rate = global_rate
+        self.global_bucket = TokenBucket(rate=global_rate, capacity=global_rate)
+        self.chat_rate = chat_rate
+        self.max_backlog = max_backlog
+        self.concurrency = concurrency
+        self.album_window = album_window
+        self.album_size = album_size
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+
+        self.chats: dict[int, deque] = {}
+        self.buckets: dict[int, TokenBucket] = {}
+        self.paused_until = 0.0
+        self.retry_at: dict[int, float] = {}
+        self.failures: dict[int, int] = {}
+
+        self._ready = None
+        self._scheduled: set[int] = set()
+        self._space = None
+        self._senders = None
+        self._tasks: set[asyncio.Task] = set()
+        self._uploads: dict[str, asyncio.Future] = {}
+        self._singles: set[int] = set()
+
+        self.backlog = 0
+        self.stats = {"enqueued": 0, "sent": 0, "failed": 0, "throttled": 0, "photo_cache_hits": 0, "photo_uploads": 0, "albums": 0, "duplicates": 0, "retried": 0}
+        self.latencies = deque(maxlen=1000)
+
+        registry.lazy(
+            "telegram_sends_total", "Notifications sent to Telegram by result",
+            lambda: {("ok",): self.stats["sent"], ("failed",): self.stats["failed"]},
+            kind="counter", labels=("result",)
+        )
+        registry.lazy("telegram_throttled_total", "Telegram 429 responses", lambda: self.stats["throttled"], kind="counter")
+        registry.lazy("delivery_queue_depth", "Notifications waiting for delivery", lambda: self.backlog)
+        registry.lazy(
+            "delivery_events_total", "Delivery service events",
+            lambda: {(event,): value for event, value in self.stats.items()},
+            kind="counter", labels=("event",)
+        )
+        registry.lazy("delivery_latency_p95_seconds", "p95 of enqueue-to-send latency", lambda: self.get_metrics()["latency_p95"])
+
+
+    def set_share(self, nodes: int) -> None:
+        """
+        Лимит бота общий для всех узлов с одним токеном, каждому достаётся равная доля
+        """
+
+        rate = self.global_rate / max(1, nodes)
+        self.global_bucket.rate = rate
+        self.global_bucket.capacity = rate
+
+
+    def _setup(self) -> None:
+        if self._ready is None:
+            self._ready = asyncio.Queue()
+            self._space = asyncio.Semaphore(self.max_backlog)
+            self._senders = asyncio.Semaphore(self.concurrency)
+
+
+    async def enqueue(self, chat_id: int, data: dict) -> bool:
+        """
+        Уведомление сначала попадает в outbox на диске и только потом в очередь отправки.
+        False — это объявление уже было поставлено в этот чат.
+        """
+
+        self._setup()
+        await self._space.acquire()
+        queued = False
+
+        try:
+            outbox_id = await outbox.append(chat_id=chat_id, data=data)
+            if outbox_id is None:
+                self.stats["duplicates"] += 1
+                return False
+
+            self._push(chat_id, data, outbox_id)
+            queued = True
+            return True
+        finally:
+            if not queued:
+                self._space.release()
+
+
+    def _push(self, chat_id: int, data: dict, outbox_id: int) -> None:
+        self.chats.setdefault(chat_id, deque()).append((time.monotonic(), data, outbox_id))
+        self.backlog += 1
+        self.stats["enqueued"] += 1
+        self._mark_ready(chat_id)
+
+
+    async def replay(self) -> int:
+        """
+        Всё, что осталось в outbox после падения или остановки, снова ставится в очередь
+        """
+
+        self._setup()
+        pending = await asyncio.to_thread(outbox.pending)
+
+        for outbox_id, chat_id, data in pending:
+            await self._space.acquire()
+            self._push(chat_id, data, outbox_id)
+
+        if pending:
+            logging.info(f"[Delivery] Восстановлено из outbox: {len(pending)}")
+        return len(pending)
+
+
+    def _mark_ready(self, chat_id: int, delay: float = 0.0) -> None:
+        if chat_id in self._scheduled:
+            return
+
+        self._scheduled.add(chat_id)
+        if delay > 0:
+            asyncio.get_running_loop().call_later(delay, self._ready.put_nowait, chat_id)
+        else:
+            self._ready.put_nowait(chat_id)
+
+
+    def _requeue(self, chat_id: int, items: list[tuple[float, dict, int]], delay: float = 0.0) -> None:
+        self.chats.setdefault(chat_id, deque()).extendleft(reversed(items))
+        self._mark_ready(chat_id, delay)
+
+
+    def _take(self, queue: deque) -> list[tuple[float, dict, int]]:
+        """
+        Следующая пачка чата: до album_size подряд, объявления из отклонённого альбома — по одному
+        """
+
+        items = [queue.popleft()]
+        if items[0][2] in self._singles:
+            return items
+
+        while queue and len(items) < self.album_size and queue[0][2] not in self._singles:
+            items.append(queue.popleft())
+        return items
+
+
+    def _done(self, item: tuple[float, dict, int]) -> None:
+        started, _, outbox_id = item
+        outbox.ack(outbox_id)
+        self._singles.discard(outbox_id)
+
+        self.backlog -= 1
+        self._space.release()
+        self.latencies.append(time.monotonic() - started)
+
+
+    async def run(self) -> None:
+        self._setup()
+        await self.replay()
+
+        while True:
+            chat_id = await self._ready.get()
+            self._scheduled.discard(chat_id)
+
+            queue = self.chats.get(chat_id)
+            if not queue:
+                self.chats.pop(chat_id, None)
+                continue
+
+            now = time.monotonic()
+            pause = max(self.paused_until, self.retry_at.get(chat_id, 0.0)) - now
+            if pause > 0:
+                self._mark_ready(chat_id, pause)
+                continue
+
+            window = queue[0][0] + self.album_window - now
+            if window > 0 and len(queue) < self.album_size:
+                self._mark_ready(chat_id, window)
+                continue
+
+            bucket = self.buckets.setdefault(chat_id, TokenBucket(rate=self.chat_rate, capacity=1))
+            wait = bucket.wait_time()
+            if wait > 0:
+                self._mark_ready(chat_id, wait)
+                continue
+
+            while (wait := self.global_bucket.wait_time()) > 0:
+                await asyncio.sleep(wait)
+
+            bucket.consume()
+            self.global_bucket.consume()
+
+            items = self._take(queue)
+            await self._senders.acquire()
+            task = asyncio.create_task(self._send(chat_id, items))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+            if queue:
+                self._mark_ready(chat_id, 1 / self.chat_rate)
+
+
+    async def _send(self, chat_id: int, items: list[tuple[float, dict, int]]) -> None:
+        try:
+            try:
+                if len(items) == 1:
+                    _, data, _ = items[0]
+                    result = await self._send_photo(chat_id=chat_id, photo=data.get("image"), caption=data.get("message"))
+                else:
+                    result = await self._send_album(chat_id=chat_id, items=items)
+            except Exception as e:
+                result = {"ok": False, "description": str(e) or type(e).__name__}
+
+            code = result.get("error_code")
+            if result.get("ok"):
+                self.stats["sent"] += len(items)
+                self._settle(chat_id, items)
+            elif code == 429:
+                retry_after = result.get("parameters", {}).get("retry_after", 1)
+                logging.warning(f"Flood control, pausing delivery for {retry_after} sec")
+                self.stats["throttled"] += 1
+                self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+                self._requeue(chat_id, items, retry_after)
+            elif code == 400 and len(items) > 1:
+                self._singles.update(outbox_id for *_, outbox_id in items)
+                self._requeue(chat_id, items)
+            elif code in PERMANENT_ERRORS:
+                logging.warning(f"Telegram error: {result}")
+                self.stats["failed"] += len(items)
+                self._settle(chat_id, items)
+            else:
+                failures = self.failures.get(chat_id, 0) + 1
+                delay = min(self.retry_max, self.retry_base * 2 ** (failures - 1))
+                self.failures[chat_id] = failures
+                self.retry_at[chat_id] = time.monotonic() + delay
+                self.stats["retried"] += len(items)
+                logging.warning(f"Send error: {result.get('description') or result}, retry in {delay} sec")
+                self._requeue(chat_id, items, delay)
+        finally:
+            self._senders.release()
+
+
+    def _settle(self, chat_id: int, items: list[tuple[float, dict, int]]) -> None:
+        self.failures.pop(chat_id, None)
+        self.retry_at.pop(chat_id, None)
+        for item in items:
+            self._done(item)
+
+
+    async def _send_album(self, chat_id: int, items: list[tuple[float, dict, int]]) -> dict:
+        """
+        При 400 альбом целиком не принят: _send вернёт объявления в очередь по одному
+        """
+
+        photos = [data.get("image") for _, data, _ in items]
+        media = [
+            {"type": "photo", "media": photo_cache.get(photo) or photo, "caption": data.get("message") or "", "parse_mode": "HTML"}
+            for photo, (_, data, _) in zip(photos, items)
+        ]
+
+        result = await send_media_group(chat_id=chat_id, media=media)
+
+        if result.get("ok"):
+            self.stats["albums"] += 1
+            for photo, message in zip(photos, result.get("result") or []):
+                file_id = extract_file_id({"ok": True, "result": message})
+                if file_id:
+                    photo_cache.put(photo, file_id)
+        elif result.get("error_code") == 400:
+            for photo in photos:
+                photo_cache.discard(photo)
+
+        return result
+
+
+    async def _send_photo(self, chat_id: int, photo: str, caption: str) -> dict:
+        """
+        Фото каждого объявления загружается в Telegram один раз:
+        первая отправка идёт по URL, остальные получатели — по file_id
+        """
+
+        file_id = photo_cache.get(photo)
+        if file_id is None and photo in self._uploads:
+            file_id = await asyncio.shield(self._uploads[photo])
+
+        if file_id:
+            self.stats["photo_cache_hits"] += 1
+            result = await send_photo(chat_id=chat_id, photo=file_id, caption=caption)
+            if result.get("ok") or result.get("error_code") == 429:
+                return result
+            photo_cache.discard(photo)
+
+        upload = asyncio.get_running_loop().create_future()
+        self._uploads[photo] = upload
+
+        try:
+            result = await send_photo(chat_id=chat_id, photo=photo, caption=caption)
+
+            if not result.get("ok") and result.get("error_code") == 400 and is_url_fetch_error(result):
+                content = await download_photo(photo)
+                if content:
+                    self.stats["photo_uploads"] += 1
+                    result = await send_photo(chat_id=chat_id, photo=content, caption=caption)
+
+            file_id = extract_file_id(result)
+            if file_id:
+                photo_cache.put(photo, file_id)
+            upload.set_result(file_id)
+            return result
+        except Exception:
+            upload.set_result(None)
+            raise
+        finally:
+            if self._uploads.get(photo) is upload:
+                del self._uploads[photo]
+
+
+    def get_metrics(self) -> dict:
+        latencies = sorted(self.latencies)
+
+        return {
+            **self.stats,
+            "queue_depth": self.backlog,
+            "chats_pending": sum(1 for q in self.chats.values() if q),
+            "latency_avg": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+            "latency_p95": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 3) if latencies else 0.0,
+        }
+
+
+PERMANENT_ERRORS = (400, 403)
+
+URL_FETCH_ERRORS = (
+    "failed to get http url content",
+    "wrong file identifier/http url specified",
+    "wrong type of the web page content",
+    "webpage_curl_failed",
+    "webpage_media_empty",
+)
+
+
+def is_url_fetch_error(result: dict) -> bool:
+    description = (result.get("description") or "").lower()
+    return any(error in description for error in URL_FETCH_ERRORS)
+
+
+def extract_file_id(result: dict) -> str | None:
+    if not result.get("ok"):
+        return None
+
+    photos = (result.get("result") or {}).get("photo") or []
+    return photos[-1].get("file_id") if photos else None
+
+
+async def download_photo(url: str) -> bytes | None:
+    try:
+        async with http_pool.get().get(url, timeout=aiohttp.ClientTimeout(total=20)) as resp:
+            if resp.status != 200:
+                return None
+            return await resp.read()
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        return None
+
+
+async def send_media_group(chat_id: int, media: list[dict]) -> dict:
+    async with http_pool.get().post(
+        f"https://api.telegram.org/bot{settings.TOKEN}/sendMediaGroup",
+        data={"chat_id": str(chat_id), "media": json.dumps(media, ensure_ascii=False)},
+    ) as resp:
+        return await resp.json()
+
+
+async def send_photo(chat_id: int, photo: str | bytes, caption: str) -> dict:
+    form = aiohttp.FormData()
+    form.add_field("chat_id", str(chat_id))
+    form.add_field("caption", caption or "")
+    form.add_field("parse_mode", "HTML")
+
+    if isinstance(photo, bytes):
+        form.add_field("photo", photo, filename="photo.jpg", content_type="image/jpeg")
+    else:
+        form.add_field("photo", photo)
+
+    async with http_pool.get().post(f"https://api.telegram.org/bot{settings.TOKEN}/sendPhoto", data=form) as resp:
+        return await resp.json()
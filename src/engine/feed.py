@@ -0,0 +1,85 @@
+import re
+
+from request import fetch_soup
+
+
+ENGINE_SUFFIXES = {
+    "": "Petrol",
+    "D": "Diesel",
+    "H": "Hybrid",
+    "G": "Petrol/gas",
+    "E": "Electro",
+}
+
+
+def feed_key(url: str) -> str:
+    return f"feed:{url}"
+
+
+def _number(text: str) -> int | None:
+    digits = re.sub(r"[^\d]", "", text or "")
+    return int(digits) if digits else None
+
+
+def parse_engine(text: str) -> tuple[float | None, str | None]:
+    text = (text or "").strip()
+    if not text:
+        return None, None
+
+    if text.lower().startswith("electr"):
+        return None, "Electro"
+
+    match = re.match(r"^(\d+(?:[.,]\d+)?)\s*([A-Za-z]?)$", text)
+    if not match:
+        return None, None
+
+    return float(match.group(1).replace(",", ".")), ENGINE_SUFFIXES.get(match.group(2).upper())
+
+
+def parse_feed(soup) -> list[dict]:
+    """
+    Строки ленты марки: ссылка, модель, год, объём и тип двигателя, цена.
+    Колонки определяются по заголовку таблицы, у разных марок он отличается.
+    """
+
+    head = soup.select_one("tr#head_line")
+    columns = []
+    for td in head.select("td") if head else []:
+        columns.extend([td.get_text(strip=True).lower()] * int(td.get("colspan", 1)))
+
+    rows = []
+    for tr in soup.select("tr[id^='tr_']"):
+        link = tr.select_one("a.am")
+        if not link or not link.get("href"):
+            continue
+
+        cells = tr.select("td")
+        row = {"href": link["href"], "title": link.get_text(strip=True)}
+
+        for name, td in zip(columns, cells):
+            text = td.get_text(" ", strip=True)
+
+            if "model" in name or "marka" in name:
+                row["model"] = text
+            elif "year" in name:
+                row["year"] = _number(text[:4])
+            elif "engine" in name or "vol" in name:
+                row["displacement"], row["typengine"] = parse_engine(text)
+            elif "price" in name:
+                row["price"] = _number(text)
+
+        rows.append(row)
+
+    return rows
+
+
+def feed_page_url(url: str, page: int = 1) -> str:
+    return url + "sell/" if page <= 1 else f"{url}sell/page{page}.html"
+
+
+async def fetch_feed(url: str, page: int = 1) -> list[dict] | None:
+    soup = await fetch_soup(feed_page_url(url, page))
+    if not soup:
+        return None
+
+    return parse_feed(soup)
@@ -0,0 +1,49 @@
+import bisect
+import hashlib
+
+
+def ring_hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """
+    Консистентное хэширование: у каждого узла replicas виртуальных точек на кольце,
+    ключ принадлежит первой точке по часовой стрелке. При добавлении или удалении
+    узла переезжает только его доля ключей.
+    """
+
+    def __init__(self, nodes=(), replicas: int = 100) -> None:
+        self.replicas = replicas
+        self.points: list[int] = []
+        self.owners: dict[int, str] = {}
+
+        for node in nodes:
+            self.add(node)
+
+
+    @property
+    def nodes(self) -> set[str]:
+        return set(self.owners.values())
+
+
+    def add(self, node: str) -> None:
+        for i in range(self.replicas):
+            point = ring_hash(f"{node}#{i}")
+            if point in self.owners:
+                continue
+            self.owners[point] = node
+            bisect.insort(self.points, point)
+
+
+    def remove(self, node: str) -> None:
+        self.points = [point for point in self.points if self.owners[point] != node]
+        self.owners = {point: owner for point, owner in self.owners.items() if owner != node}
+
+
+    def get(self, key: str) -> str | None:
+        if not self.points:
+            return None
+
+        i = bisect.bisect_right(self.points, ring_hash(key)) % len(self.points)
+        return self.owners[self.points[i]]
@@ -0,0 +1,271 @@
+import bisect
+import threading
+
+
+NUMERIC_FIELDS = {
+    "year": ("min_year", "max_year"),
+    "displacement": ("min_displacement", "max_displacement"),
+    "price": ("min_price", "max_price"),
+}
+
+SET_FIELDS = {
+    "typengine": "typengines",
+    "gearbox": "gearbox",
+    "bodytype": "bodytypes",
+    "inspection": "inspection",
+}
+
+
+def _to_float(value) -> float | None:
+    if value in (None, ""):
+        return None
+    try:
+        return float(str(value).replace(",", "."))
+    except ValueError:
+        return None
+
+
+def _as_list(value) -> list[str]:
+    if value in (None, "", []):
+        return []
+    return [str(v) for v in value] if isinstance(value, list) else [str(value)]
+
+
+class IntervalDim:
+    """
+    Фильтры с границами [low, high] по одному числовому полю.
+    Битсет фильтров на каждую различную границу: подходящие фильтры — это
+    OR битсетов границ low <= значения, AND OR битсетов границ high >= значения.
+    Добавление и удаление меняют один битсет на сторону, без пересборки.
+    """
+
+    def __init__(self) -> None:
+        self.low_keys: list[float] = []
+        self.high_keys: list[float] = []
+        self.lows: dict[float, int] = {}
+        self.highs: dict[float, int] = {}
+        self.bounds: dict[int, tuple[float, float]] = {}
+        self.unbounded = 0
+
+
+    @staticmethod
+    def _set(keys: list[float], masks: dict[float, int], key: float, bit: int) -> None:
+        if key not in masks:
+            bisect.insort(keys, key)
+            masks[key] = 0
+        masks[key] |= bit
+
+
+    @staticmethod
+    def _unset(keys: list[float], masks: dict[float, int], key: float, bit: int) -> None:
+        masks[key] &= ~bit
+        if not masks[key]:
+            del masks[key]
+            del keys[bisect.bisect_left(keys, key)]
+
+
+    def add(self, slot: int, low: float | None, high: float | None) -> None:
+        if slot in self.bounds:
+            self.remove(slot)
+
+        bit = 1 << slot
+        low = float("-inf") if low is None else low
+        high = float("inf") if high is None else high
+        self.bounds[slot] = (low, high)
+        if low == float("-inf") and high == float("inf"):
+            self.unbounded |= bit
+
+        self._set(self.low_keys, self.lows, low, bit)
+        self._set(self.high_keys, self.highs, high, bit)
+
+
+    def remove(self, slot: int) -> None:
+        if slot not in self.bounds:
+            return
+
+        bit = 1 << slot
+        low, high = self.bounds.pop(slot)
+        self.unbounded &= ~bit
+        self._unset(self.low_keys, self.lows, low, bit)
+        self._unset(self.high_keys, self.highs, high, bit)
+
+
+    def lookup(self, value: float | None) -> int:
+        if value is None:
+            return self.unbounded
+
+        low_mask = 0
+        for key in self.low_keys[:bisect.bisect_right(self.low_keys, value)]:
+            low_mask |= self.lows[key]
+        if not low_mask:
+            return 0
+
+        high_mask = 0
+        for key in self.high_keys[bisect.bisect_left(self.high_keys, value):]:
+            high_mask |= self.highs[key]
+
+        return low_mask & high_mask
+
+
+class SetDim:
+    """
+    Мультиселект: значение -> битсет фильтров, которые его выбрали,
+    плюс битсет фильтров без ограничения по полю
+    """
+
+    def __init__(self) -> None:
+        self.values: dict[str, int] = {}
+        self.slots: dict[int, list[str]] = {}
+        self.any = 0
+
+
+    def add(self, slot: int, values: list[str]) -> None:
+        bit = 1 << slot
+        values = [value.lower() for value in values]
+        self.slots[slot] = values
+        if not values:
+            self.any |= bit
+            return
+
+        for value in values:
+            self.values[value] = self.values.get(value, 0) | bit
+
+
+    def remove(self, slot: int) -> None:
+        bit = ~(1 << slot)
+        self.any &= bit
+        for value in self.slots.pop(slot, ()):
+            if value in self.values:
+                self.values[value] &= bit
+                if not self.values[value]:
+                    del self.values[value]
+
+
+    def lookup(self, value: str | None) -> int:
+        if value is None:
+            return self.any
+        return self.any | self.values.get(str(value).lower(), 0)
+
+
+class BrandIndex:
+    """
+    Фильтры одной марки со своей нумерацией слотов: ширина битсетов —
+    число фильтров марки, а не всех фильтров
+    """
+
+    def __init__(self) -> None:
+        self.all = 0
+        self.models = SetDim()
+        self.numeric = {name: IntervalDim() for name in NUMERIC_FIELDS}
+        self.sets = {name: SetDim() for name in SET_FIELDS}
+        self.slot_keys: list[str | None] = []
+        self._free: list[int] = []
+
+
+    def alloc(self, key: str) -> int:
+        if self._free:
+            slot = self._free.pop()
+            self.slot_keys[slot] = key
+        else:
+            slot = len(self.slot_keys)
+            self.slot_keys.append(key)
+        return slot
+
+
+    def release(self, slot: int) -> None:
+        self.slot_keys[slot] = None
+        self._free.append(slot)
+
+
+class FilterIndex:
+    """
+    Обратный индекс: атрибуты объявления -> множество подходящих фильтров.
+    Хэш по марке и модели, интервалы по году/объёму/цене, битсеты по мультиселектам.
+    Обновляется инкрементально при добавлении, правке и удалении фильтра.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.brands: dict[str, BrandIndex] = {}
+        self.slots: dict[str, tuple[int, str]] = {}
+
+
+    def add(self, key: str, info: dict) -> None:
+        with self.lock:
+            if key in self.slots:
+                self._remove(key)
+
+            url = info.get("url")
+            brand = self.brands.setdefault(url, BrandIndex())
+            slot = brand.alloc(key)
+            self.slots[key] = (slot, url)
+
+            brand.all |= 1 << slot
+            brand.models.add(slot, _as_list(info.get("models")))
+
+            for name, (low, high) in NUMERIC_FIELDS.items():
+                brand.numeric[name].add(slot, _to_float(info.get(low)), _to_float(info.get(high)))
+
+            for name, field in SET_FIELDS.items():
+                brand.sets[name].add(slot, _as_list(info.get(field)))
+
+
+    def remove(self, key: str) -> None:
+        with self.lock:
+            self._remove(key)
+
+
+    def update(self, key: str, info: dict) -> None:
+        self.add(key, info)
+
+
+    def _remove(self, key: str) -> None:
+        if key not in self.slots:
+            return
+
+        slot, url = self.slots.pop(key)
+        brand = self.brands[url]
+
+        brand.all &= ~(1 << slot)
+        brand.models.remove(slot)
+        for dim in brand.numeric.values():
+            dim.remove(slot)
+        for dim in brand.sets.values():
+            dim.remove(slot)
+
+        brand.release(slot)
+        if not brand.all:
+            del self.brands[url]
+
+
+    def lookup(self, url: str, attrs: dict) -> set[str]:
+        """
+        attrs: model, year, displacement, price, typengine, gearbox, bodytype, inspection.
+        Поле, которого нет в attrs, не проверяется; поле со значением None
+        пропускает только фильтры без ограничения по нему.
+        """
+
+        with self.lock:
+            brand = self.brands.get(url)
+            if not brand:
+                return set()
+
+            mask = brand.all
+            if "model" in attrs:
+                mask &= brand.models.lookup(attrs["model"])
+
+            for name, dim in brand.numeric.items():
+                if mask and name in attrs:
+                    mask &= dim.lookup(_to_float(attrs[name]))
+
+            for name, dim in brand.sets.items():
+                if mask and name in attrs:
+                    mask &= dim.lookup(attrs[name])
+
+            keys = set()
+            while mask:
+                low = mask & -mask
+                keys.add(brand.slot_keys[low.bit_length() - 1])
+                mask ^= low
+
+            return keys
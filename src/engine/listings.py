@@ -0,0 +1,178 @@
+import asyncio
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+import aiohttp
+from bs4 import BeautifulSoup as bs
+
+from src.utils.session import http_pool
+from src.utils.metrics import registry, detail_fetches
+
+
+SITE_TZ = timezone(timedelta(hours=2))
+
+SELECTORS = {
+    "model": ("tdo_31", "🚙 <b>{}</b>"),
+    "price": ("tdo_8", "<b>Price:</b> {}"),
+    "year": ("tdo_18", "<b>Year:</b> {}"),
+    "engine_type": ("tdo_15", "<b>Engine type:</b> {}"),
+    "gearbox": ("tdo_35", "<b>Gearbox:</b> {}"),
+    "mileage": ("tdo_16", "<b>Mileage:</b> {}"),
+    "checkup": ("tdo_223", "<b>Checkup:</b> {}"),
+}
+
+EXTRA_FIELDS = {
+    "bodytype": "tdo_32",
+}
+
+
+def fetch_address_from_page(soup):
+    row = soup.find('td', class_='ads_contacts_name', string="Address:")
+    cell = row.find_next_sibling('td') if row else None
+    tag = cell.find('a', class_='a9a') if cell else None
+    return (tag or cell).get_text(strip=True) if (tag or cell) else None
+
+
+def fetch_place(soup):
+    row = soup.find('td', string=lambda t: t and "Place:" in t)
+    cell = row.find_next('td', class_='ads_contacts') if row else None
+    return cell.get_text(strip=True) if cell else None
+
+
+def fetch_date(soup) -> datetime | None:
+    td = soup.find("td", class_="msg_footer", string=lambda x: x and "Date:" in x)
+    if not td:
+        return None
+
+    try:
+        raw_date = td.get_text(strip=True).replace("Date:", "").strip()
+        return datetime.strptime(raw_date, "%d.%m.%Y %H:%M").replace(tzinfo=SITE_TZ)
+    except ValueError:
+        return None
+
+
+def parse_listing(soup, url: str) -> dict:
+    """
+    Все поля страницы объявления за один разбор: дата, фото, tdo_*, адрес и готовая подпись
+    """
+
+    fields = {}
+    for key, (id_, _) in SELECTORS.items():
+        el = soup.find(id=id_)
+        if el:
+            fields[key] = el.get_text(strip=True)
+
+    extra = {}
+    for key, id_ in EXTRA_FIELDS.items():
+        el = soup.find(id=id_)
+        if el:
+            extra[key] = el.get_text(strip=True)
+
+    listing = {
+        "url": url,
+        "date": fetch_date(soup),
+        "image": (soup.select_one("div.pic_dv_thumbnail a") or {}).get("href"),
+        "fields": fields,
+        "address": fetch_address_from_page(soup),
+        "place": fetch_place(soup),
+    }
+
+    parts = [SELECTORS[key][1].format(value) for key, value in fields.items()]
+    listing["fields"] = {**fields, **extra}
+    if not listing["image"] or not parts:
+        return {**listing, "success": False, "error": "big_photo_src or data missing"}
+
+    if listing["address"]:
+        parts.append(f"<b>Address:</b> {listing['address']}")
+    if listing["place"]:
+        parts.append(f"<b>Place:</b> {listing['place']}")
+
+    parts.append(f"<a href='{url}'>Go to webpage</a>")
+
+    return {**listing, "success": True, "message": "\n".join(parts)}
+
+
+async def fetch_listing(url: str) -> dict:
+    try:
+        async with http_pool.get().get(url, timeout=aiohttp.ClientTimeout(total=10)) as resp:
+            if resp.status != 200:
+                return {"success": False, "error": f"status {resp.status}"}
+            html = await resp.text()
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        return {"success": False, "error": str(e) or type(e).__name__}
+
+    if not html:
+        return {"success": False, "error": "empty html"}
+
+    return parse_listing(bs(html, "lxml"), url)
+
+
+class ListingCache:
+    """
+    LRU-кэш разобранных объявлений с TTL. Одновременные запросы одного URL
+    ждут одну и ту же загрузку. Живёт в loop'е движка поиска.
+    """
+
+    def __init__(self, maxsize: int = 2000, ttl: float = 900.0) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._inflight: dict[str, asyncio.Future] = {}
+        self.stats = {"hits": 0, "misses": 0, "fetches": 0}
+
+        registry.lazy(
+            "listing_cache_requests_total", "Ad detail lookups by cache result",
+            lambda: {("hit",): self.stats["hits"], ("miss",): self.stats["misses"]},
+            kind="counter", labels=("result",)
+        )
+
+
+    @staticmethod
+    def _key(url: str) -> str:
+        return url.split("?", 1)[0].split("#", 1)[0]
+
+
+    async def get(self, url: str) -> dict:
+        key = self._key(url)
+
+        entry = self._data.get(key)
+        if entry and time.monotonic() - entry[0] < self.ttl:
+            self._data.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry[1]
+
+        if key in self._inflight:
+            self.stats["hits"] += 1
+            return await asyncio.shield(self._inflight[key])
+
+        self.stats["misses"] += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+
+        try:
+            self.stats["fetches"] += 1
+            with detail_fetches.time():
+                listing = await fetch_listing(url)
+            if listing.get("success"):
+                self._store(key, listing)
+            future.set_result(listing)
+            return listing
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+
+    def _store(self, key: str, listing: dict) -> None:
+        self._data[key] = (time.monotonic(), listing)
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+
+
+listing_cache = ListingCache()
@@ -0,0 +1,154 @@
+import json
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from config import settings
+
+
+class Outbox:
+    """
+    Журнал неотправленных уведомлений в SQLite (WAL).
+    Запись считается принятой только после коммита пачки: append ждёт ближайший
+    групповой коммит, так что fsync делается один раз на пачку, а не на сообщение.
+    Доставка at-least-once, повтор одного и того же объявления в чат отсекается по dedup-ключу.
+    """
+
+    def __init__(self, path: str = "data_tasks/outbox.db", flush_interval: float = 0.05,
+                 batch_size: int = 200, retention: float = 7 * 24 * 3600) -> None:
+        self.path = Path(path)
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.retention = retention
+
+        self.lock = threading.Lock()
+        self._conn = None
+        self._appends: list[tuple[str, int, str, asyncio.Future]] = []
+        self._acks: list[int] = []
+        self._flush_now = None
+        self._flushes = 0
+
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=FULL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    dedup TEXT NOT NULL UNIQUE,
+                    chat_id INTEGER NOT NULL,
+                    payload TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    acked INTEGER NOT NULL DEFAULT 0
+                );
+                CREATE INDEX IF NOT EXISTS outbox_pending ON outbox (acked, id);
+            """)
+        return self._conn
+
+
+    @staticmethod
+    def dedup_key(chat_id: int, data: dict) -> str:
+        return f"{chat_id}:{data.get('url') or data.get('image')}"
+
+
+    async def append(self, chat_id: int, data: dict) -> int | None:
+        """
+        id записи после коммита или None, если это объявление уже есть в журнале для этого чата
+        """
+
+        future = asyncio.get_running_loop().create_future()
+        self._appends.append((self.dedup_key(chat_id, data), chat_id, json.dumps(data, ensure_ascii=False), future))
+
+        if len(self._appends) >= self.batch_size and self._flush_now:
+            self._flush_now.set()
+
+        return await future
+
+
+    def ack(self, outbox_id: int) -> None:
+        self._acks.append(outbox_id)
+
+
+    def pending(self) -> list[tuple[int, int, dict]]:
+        with self.lock:
+            rows = self._connect().execute("SELECT id, chat_id, payload FROM outbox WHERE acked = 0 ORDER BY id").fetchall()
+        return [(outbox_id, chat_id, json.loads(payload)) for outbox_id, chat_id, payload in rows]
+
+
+    def _write(self, appends: list[tuple[str, int, str]], acks: list[int]) -> list[int | None]:
+        now = time.time()
+        ids = []
+
+        with self.lock:
+            conn = self._connect()
+            with conn:
+                for dedup, chat_id, payload in appends:
+                    cursor = conn.execute(
+                        "INSERT OR IGNORE INTO outbox (dedup, chat_id, payload, created) VALUES (?, ?, ?, ?)",
+                        (dedup, chat_id, payload, now)
+                    )
+                    ids.append(cursor.lastrowid if cursor.rowcount else None)
+
+                if acks:
+                    conn.executemany("UPDATE outbox SET acked = 1 WHERE id = ?", [(i,) for i in acks])
+
+                self._flushes += 1
+                if self._flushes % 1000 == 0:
+                    conn.execute("DELETE FROM outbox WHERE acked = 1 AND created < ?", (now - self.retention,))
+
+        return ids
+
+
+    async def flush(self) -> None:
+        appends, self._appends = self._appends, []
+        acks, self._acks = self._acks, []
+        if not appends and not acks:
+            return
+
+        try:
+            ids = await asyncio.to_thread(self._write, [item[:3] for item in appends], acks)
+        except Exception as e:
+            for *_, future in appends:
+                if not future.done():
+                    future.set_exception(e)
+            self._acks = acks + self._acks
+            raise
+
+        for outbox_id, (*_, future) in zip(ids, appends):
+            if not future.done():
+                future.set_result(outbox_id)
+
+
+    async def run(self) -> None:
+        self._flush_now = asyncio.Event()
+
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(self._flush_now.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+                self._flush_now.clear()
+                try:
+                    await self.flush()
+                except Exception as e:
+                    logging.error(f"[Outbox] Ошибка записи журнала: {e}", exc_info=True)
+        finally:
+            await self.flush()
+
+
+    def close(self) -> None:
+        with self.lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+outbox = Outbox(path=settings.node_path("outbox.db"))
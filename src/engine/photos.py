@@ -0,0 +1,98 @@
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from config import settings
+
+
+class PhotoCache:
+    """
+    URL фото объявления -> file_id Telegram после первой удачной отправки.
+    Хранится в SQLite, лишние записи вытесняются по времени последнего использования.
+    Время использования при попадании копится в памяти и пишется пачкой.
+    """
+
+    def __init__(self, path: str = "data_tasks/photos.db", max_rows: int = 20000, touch_batch: int = 200) -> None:
+        self.path = Path(path)
+        self.max_rows = max_rows
+        self.touch_batch = touch_batch
+        self.lock = threading.Lock()
+        self._conn = None
+        self._writes = 0
+        self._touched: dict[str, float] = {}
+
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS photos (
+                    url TEXT PRIMARY KEY,
+                    file_id TEXT NOT NULL,
+                    used REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS photos_used ON photos (used)")
+        return self._conn
+
+
+    def get(self, url: str) -> str | None:
+        with self.lock:
+            conn = self._connect()
+            row = conn.execute("SELECT file_id FROM photos WHERE url = ?", (url,)).fetchone()
+            if row:
+                self._touched[url] = time.time()
+                if len(self._touched) >= self.touch_batch:
+                    with conn:
+                        self._flush_touched(conn)
+            return row[0] if row else None
+
+
+    def _flush_touched(self, conn: sqlite3.Connection) -> None:
+        if self._touched:
+            conn.executemany("UPDATE photos SET used = ? WHERE url = ?", [(used, url) for url, used in self._touched.items()])
+            self._touched.clear()
+
+
+    def put(self, url: str, file_id: str) -> None:
+        with self.lock:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO photos (url, file_id, used) VALUES (?, ?, ?)",
+                    (url, file_id, time.time())
+                )
+                self._touched.pop(url, None)
+
+                self._writes += 1
+                if self._writes % 100 == 0:
+                    self._flush_touched(conn)
+                    conn.execute("""
+                        DELETE FROM photos WHERE url NOT IN (
+                            SELECT url FROM photos ORDER BY used DESC LIMIT ?
+                        )
+                    """, (self.max_rows,))
+
+
+    def discard(self, url: str) -> None:
+        with self.lock:
+            conn = self._connect()
+            with conn:
+                conn.execute("DELETE FROM photos WHERE url = ?", (url,))
+            self._touched.pop(url, None)
+
+
+    def close(self) -> None:
+        with self.lock:
+            if self._conn is not None:
+                with self._conn:
+                    self._flush_touched(self._conn)
+                self._conn.close()
+                self._conn = None
+
+
+photo_cache = PhotoCache(path=settings.node_path("photos.db"))
@@ -0,0 +1,41 @@
+import math
+import random
+
+
+class PollingPolicy:
+    """
+    Интервал опроса по скорости появления объявлений.
+    Скорость (объявлений в час) сглаживается EWMA с затуханием по времени,
+    интервал подбирается так, чтобы на один опрос приходилось около target_hits новых объявлений.
+    """
+
+    def __init__(self, min_interval: float = 15.0, max_interval: float = 900.0,
+                 target_hits: float = 0.5, half_life: float = 3600.0, jitter: float = 0.1) -> None:
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.target_hits = target_hits
+        self.half_life = half_life
+        self.jitter = jitter
+
+
+    def initial_rate(self, interval: float = 30.0) -> float:
+        return 3600.0 * self.target_hits / interval
+
+
+    def update(self, rate: float, elapsed: float, new_count: int) -> float:
+        if elapsed <= 0:
+            return rate
+
+        observed = new_count * 3600.0 / elapsed
+        weight = 1.0 - math.exp(-elapsed * math.log(2) / self.half_life)
+        return rate + weight * (observed - rate)
+
+
+    def interval(self, rate: float) -> float:
+        if rate <= 0:
+            interval = self.max_interval
+        else:
+            interval = 3600.0 * self.target_hits / rate
+
+        interval = min(max(interval, self.min_interval), self.max_interval)
+        return interval * random.uniform(1 - self.jitter, 1 + self.jitter)
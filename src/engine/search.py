@@ -0,0 +1,587 @@
+import threading, asyncio, logging, heapq, itertools, time
+
+from playwright.async_api import async_playwright
+
+from config import settings
+from request import search_ads, filter_fingerprint
+from src.utils.session import http_pool
+from src.engine.listings import listing_cache
+from src.engine.seen import seen_store, ad_id_from_href
+from src.engine.polling import PollingPolicy
+from src.engine.feed import fetch_feed, feed_key
+from src.engine.index import FilterIndex
+from src.engine.delivery import DeliveryService
+from src.engine.photos import photo_cache
+from src.engine.outbox import outbox
+from src.utils.metrics import registry, scrape_cycles, scrape_steps, ads_found
+
+
+def job_key(info: dict, mode: str) -> str:
+    if mode == "feed":
+        return feed_key(info.get("url"))
+    return filter_fingerprint(info)
+
+
+class FilterJob:
+    def __init__(self, key: str, info: dict):
+        self.key = key
+        self.info = dict(info)
+        self.subscribers: dict[str, int] = {}
+        self.attempt = 0
+        self.running = False
+        self.rate = 0.0
+        self.last_poll = None
+        self.pending_seen: list[int] = []
+
+
+class SearchEngine:
+    """
+    Один поток, один event loop и один браузер на все фильтры всех пользователей.
+    Одинаковые фильтры схлопываются в одну задачу по отпечатку запроса, задачи
+    ставятся в кучу по времени следующего запуска, а ограниченный пул воркеров
+    забирает из неё те, чей срок подошёл.
+    """
+
+    def __init__(self, workers: int = 4, policy: PollingPolicy | None = None, mode: str | None = None, sink=None):
+        self.lock = threading.Lock()
+        self.mode = mode or settings.SEARCH_MODE
+        self.jobs: dict[str, FilterJob] = {}
+        self.filters: dict[str, tuple[int, dict]] = {}
+        self.index = FilterIndex() if self.mode == "feed" else None
+        self.workers = workers
+        self.policy = policy or PollingPolicy(
+            min_interval=settings.POLL_MIN_INTERVAL,
+            max_interval=settings.POLL_MAX_INTERVAL,
+            target_hits=settings.POLL_TARGET_HITS,
+        )
+        self.delivery = DeliveryService() if sink is None else None
+        self.sink = sink or self.delivery.enqueue
+
+        self.loop = None
+        self.thread = None
+        self.browser = None
+        self._playwright = None
+        self._browser_lock = None
+        self.stop_event = threading.Event()
+
+        self._heap: list[tuple[float, int, FilterJob]] = []
+        self._seq = itertools.count()
+        self._wakeup = None
+        self._main_task = None
+
+        self.due = None
+
+        registry.lazy("active_filters", "Filters running in this engine", lambda: len(self.filters))
+        registry.lazy("active_jobs", "Coalesced scrape jobs", lambda: len(self.jobs))
+        registry.lazy("scheduled_jobs", "Jobs waiting in the schedule heap", lambda: len(self._heap))
+        registry.lazy("active_browsers", "Launched Playwright browsers", lambda: 1 if self.browser else 0)
+
+
+    def start(self):
+        with self.lock:
+            if self.thread and self.thread.is_alive():
+                return
+
+            self.stop_event.clear()
+            self.loop = asyncio.new_event_loop()
+            self.thread = threading.Thread(target=self._run, name="SearchEngine", daemon=True)
+            self.thread.start()
+
+
+    def stop(self):
+        self.stop_event.set()
+        if self.loop and self._main_task:
+            self.loop.call_soon_threadsafe(self._main_task.cancel)
+
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+
+        try:
+            self._main_task = self.loop.create_task(self._main())
+            self.loop.run_until_complete(self._main_task)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logging.error(f"[SearchEngine] Ошибка в run: {e}", exc_info=True)
+        finally:
+            self.loop.close()
+
+
+    async def _main(self):
+        self._wakeup = asyncio.Event()
+        self.due = asyncio.Queue()
+        self._browser_lock = asyncio.Lock()
+
+        services = (outbox.run(), self.delivery.run()) if self.delivery else ()
+
+        try:
+            await asyncio.gather(
+                self._scheduler(),
+                self._sweeper(),
+                *services,
+                *(self._scrape_worker() for _ in range(self.workers))
+            )
+        finally:
+            if self.browser:
+                await self.browser.close()
+            if self._playwright:
+                await self._playwright.stop()
+            await http_pool.close()
+            seen_store.close()
+            if self.delivery:
+                photo_cache.close()
+                outbox.close()
+
+
+    async def _get_browser(self):
+        async with self._browser_lock:
+            if not self.browser:
+                self._playwright = await async_playwright().start()
+                self.browser = await self._playwright.chromium.launch(headless=True)
+
+        return self.browser
+
+
+    def _notify(self):
+        if self.loop and self._wakeup and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self._wakeup.set)
+
+
+    def _schedule(self, job: FilterJob, delay: float = 0.0):
+        with self.lock:
+            heapq.heappush(self._heap, (time.monotonic() + delay, next(self._seq), job))
+        self._notify()
+
+
+    def _job_key(self, info: dict) -> str:
+        return job_key(info, self.mode)
+
+
+    def _subscribe(self, uid: int, key: str, info: dict):
+        fingerprint = self._job_key(info)
+        created = fingerprint not in self.jobs
+        if created:
+            job = FilterJob(key=fingerprint, info=info)
+            rate = seen_store.get_rate(fingerprint)
+            job.rate = self.policy.initial_rate() if rate is None else rate
+            self.jobs[fingerprint] = job
+
+        job = self.jobs[fingerprint]
+        job.subscribers[key] = uid
+        self.filters[key] = (uid, info)
+        if self.index:
+            self.index.add(key, info)
+
+        return job if created else None
+
+
+    def _unsubscribe(self, key: str):
+        uid, info = self.filters.pop(key)
+        if self.index:
+            self.index.remove(key)
+        fingerprint = self._job_key(info)
+
+        job = self.jobs.get(fingerprint)
+        if job:
+            job.subscribers.pop(key, None)
+            if not job.subscribers:
+                self.jobs.pop(fingerprint, None)
+                seen_store.forget(fingerprint)
+
+        return uid, info
+
+
+    def add_filter(self, uid: int, key: str, info: dict):
+        with self.lock:
+            if key in self.filters:
+                return
+            job = self._subscribe(uid=uid, key=key, info=dict(info))
+
+        if job:
+            self._schedule(job)
+        logging.info(f"Фильтр добавлен напрямую: {key}")
+
+
+    def update_filter(self, new_filter: dict):
+        created = []
+
+        with self.lock:
+            for key, value in new_filter.items():
+                if key not in self.filters:
+                    continue
+
+                uid, info = self._unsubscribe(key)
+                if isinstance(value, dict):
+                    info = {**info, **value}
+                    logging.info(f"Поля {list(value)} обновлены для фильтра {key}")
+                else:
+                    info = value
+                    logging.info(f"Фильтр {key} обновлён целиком")
+
+                if job := self._subscribe(uid=uid, key=key, info=info):
+                    created.append(job)
+
+        for job in created:
+            self._schedule(job)
+
+
+    def has_filter(self, key: str) -> bool:
+        with self.lock:
+            return key in self.filters
+
+
+    def remove_filter(self, key: str) -> bool:
+        with self.lock:
+            if key not in self.filters:
+                return False
+            self._unsubscribe(key)
+
+        logging.info(f"Фильтр удалён напрямую: {key}")
+        return True
+
+
+    def remove_user(self, uid: int) -> list[str]:
+        with self.lock:
+            keys = [key for key, (owner, _) in self.filters.items() if owner == uid]
+            for key in keys:
+                self._unsubscribe(key)
+
+        return keys
+
+
+    def get_filters(self, uid: int) -> dict[str, int]:
+        with self.lock:
+            return {
+                key: self.jobs[self._job_key(info)].attempt
+                for key, (owner, info) in self.filters.items() if owner == uid
+            }
+
+
+    def snapshot(self) -> dict[str, tuple[int, dict]]:
+        with self.lock:
+            return {key: (uid, dict(info)) for key, (uid, info) in self.filters.items()}
+
+
+    def get_attempts(self) -> dict[str, int]:
+        with self.lock:
+            return {key: self.jobs[self._job_key(info)].attempt for key, (_, info) in self.filters.items()}
+
+
+    async def _scheduler(self):
+        while not self.stop_event.is_set():
+            self._wakeup.clear()
+            now = time.monotonic()
+            ready = []
+
+            with self.lock:
+                while self._heap and self._heap[0][0] <= now:
+                    _, _, job = heapq.heappop(self._heap)
+                    if self.jobs.get(job.key) is job and not job.running:
+                        job.running = True
+                        ready.append(job)
+
+                timeout = self._heap[0][0] - now if self._heap else None
+
+            for job in ready:
+                self.due.put_nowait(job)
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+
+    async def _sweeper(self, interval: float = 3600.0):
+        while not self.stop_event.is_set():
+            with self.lock:
+                keep = set(self.jobs)
+
+            try:
+                if removed := seen_store.sweep(keep):
+                    logging.info(f"[SearchEngine] Удалено устаревших отпечатков: {removed}")
+            except Exception as e:
+                logging.warning(f"[SearchEngine] Ошибка очистки seen: {e}")
+
+            await asyncio.sleep(interval)
+
+
+    async def _scrape_worker(self):
+        while not self.stop_event.is_set():
+            job = await self.due.get()
+            new_ads, ok = None, False
+
+            try:
+                new_ads = await self._scrape(job)
+                ok = True
+                scrape_cycles.inc(result="ok")
+                if new_ads:
+                    ads_found.inc(len(new_ads))
+                await asyncio.gather(*(
+                    self.sink(chat_id=uid, data=data)
+                    for uids, data in new_ads or [] for uid in uids
+                ))
+
+                if job.pending_seen:
+                    seen_store.add(job.key, job.pending_seen)
+                    job.pending_seen = []
+            except Exception as e:
+                scrape_cycles.inc(result="error")
+                logging.warning(f"Ошибка при обработке {job.key}: {e}")
+            finally:
+                job.running = False
+
+            now = time.monotonic()
+            if ok and job.last_poll is not None:
+                job.rate = self.policy.update(job.rate, now - job.last_poll, len(new_ads or []))
+                seen_store.set_rate(job.key, job.rate)
+            if ok:
+                job.last_poll = now
+
+            with self.lock:
+                alive = self.jobs.get(job.key) is job
+
+            if alive:
+                self._schedule(job, self.policy.interval(job.rate))
+
+
+    async def _scrape(self, job: FilterJob):
+        if self.mode == "feed":
+            return await self._scrape_feed(job)
+
+        with scrape_steps.time(step="search"):
+            ads = await search_ads(job.info)
+        if ads is None:
+            logging.info(f"[{job.key}] Прямой запрос не удался, ищем через браузер")
+            ads = await self._browser_search(job)
+
+        if ads is None:
+            return None
+
+        new_ads = await self._process_ads(job, ads)
+        if not new_ads:
+            return None
+
+        with self.lock:
+            uids = set(job.subscribers.values())
+
+        return [(uids, data) for data in new_ads]
+
+
+    async def _read_feed(self, job: FilterJob, max_pages: int = 5) -> list[dict] | None:
+        """
+        Страницы ленты читаются, пока не встретится уже просмотренное объявление,
+        чтобы за длинный интервал опроса ничего не ушло на вторую страницу
+        """
+
+        url, key = job.info["url"], job.key
+        known = seen_store.known(key)
+        rows, hrefs = [], set()
+
+        for page in range(1, max_pages + 1):
+            with scrape_steps.time(step="feed"):
+                page_rows = await fetch_feed(url, page)
+            if page_rows is None:
+                return rows or None
+
+            fresh = [row for row in page_rows if row["href"] not in hrefs]
+            if not fresh:
+                break
+
+            rows.extend(fresh)
+            hrefs.update(row["href"] for row in fresh)
+
+            ids = [ad_id_from_href(row["href"]) for row in fresh]
+            if not known or len(seen_store.filter_new(key, ids)) < len(ids):
+                break
+        else:
+            logging.warning(f"[{key}] Прочитано {max_pages} страниц ленты без просмотренных объявлений")
+
+        return rows
+
+
+    async def _scrape_feed(self, job: FilterJob):
+        """
+        Одна лента на марку, все фильтры этой марки проверяются локально
+        """
+
+        rows = await self._read_feed(job)
+        if rows is None:
+            return None
+
+        key = job.key
+        job.attempt += 1
+        ids = {ad_id_from_href(row["href"]): row for row in rows}
+
+        if not seen_store.known(key):
+            seen_store.add(key, ids)
+            return None
+
+        new_ids = seen_store.filter_new(key, ids)
+        if not new_ids:
+            return None
+
+        url = job.info["url"]
+        deliveries = []
+        for ad_id in new_ids:
+            row = ids[ad_id]
+            attrs = {
+                field: row[field] for field in ("model", "year", "displacement", "typengine", "price")
+                if row.get(field) not in (None, "")
+            }
+            if not self.index.lookup(url, attrs):
+                continue
+
+            ad_url = f"https://www.ss.com{row['href']}"
+            listing = await listing_cache.get(ad_url)
+            if not listing.get("success"):
+                logging.warning(listing.get("error"))
+                continue
+
+            fields = listing.get("fields", {})
+            for field, name in (("gearbox", "gearbox"), ("bodytype", "bodytype"), ("inspection", "checkup")):
+                if fields.get(name):
+                    attrs[field] = fields[name]
+
+            matched = self.index.lookup(url, attrs)
+            with self.lock:
+                uids = {job.subscribers[fkey] for fkey in matched if fkey in job.subscribers}
+
+            if uids:
+                logging.info(f"Новое объявление [{key}] | {ad_url} | подписчиков: {len(uids)}")
+                deliveries.append((uids, {"success": True, "url": ad_url, "image": listing["image"], "message": listing["message"]}))
+
+        job.pending_seen = new_ids
+
+        return deliveries or None
+
+
+    async def _browser_search(self, job: FilterJob):
+        browser = await self._get_browser()
+        context = await browser.new_context()
+        try:
+            page_obj = await self._open_page(context, job.key, job.info)
+            if not page_obj:
+                return None
+
+            return await self._process_page(page_obj["page"], job.info, job.key)
+        finally:
+            await context.close()
+
+
+    async def _open_page(self, context, key, info):
+        page = await context.new_page()
+
+        try:
+            with scrape_steps.time(step="load"):
+                await page.goto(info["url"] + "search/", timeout=5000)
+                await page.wait_for_load_state("networkidle")
+            return {"page": page, "info": info, "key": key}
+        except Exception as e:
+            logging.warning(f"[{key}] Ошибка при загрузке страницы: {e}")
+            await page.close()   
+            return None
+
+
+    async def _process_page(self, page, info, key):
+        await asyncio.sleep(1)
+
+        options = {
+            "select[name='cid[]']": info.get('models'),
+            "select[name='topt[18][min]']": info.get("min_year"),
+            "select[name='topt[18][max]']": info.get("max_year"),
+            "input[name='topt[15][min]']": info.get("min_displacement"),
+            "input[name='topt[15][max]']": info.get("max_displacement"),
+            "select[name='opt[34][]']": info.get("typengines"),
+            "select[name='opt[35][]']": info.get("gearbox"),
+            "select[name='opt[32][]']": info.get("bodytypes"),
+            "select[name='opt[223][]']": info.get("inspection"),
+            "input[name='topt[8][min]']": info.get("min_price"),
+            "input[name='topt[8][max]']": info.get("max_price"),
+            "select[name='sid']": "Sell"
+        }
+
+        fill_started = time.perf_counter()
+        for selector, value in options.items():
+            if value is None:
+                continue
+            try:
+                if selector.startswith("select"):
+                    options_elements = await page.query_selector_all(selector + " option")
+                    available_labels = [await opt.inner_text() for opt in options_elements]
+
+                    if isinstance(value, list):
+                        valid_values = [str(v) for v in value if str(v) in available_labels]
+                        if valid_values:
+                            await page.select_option(selector, label=valid_values, timeout=3000)
+                    else:
+                        if str(value) in available_labels:
+                            await page.select_option(selector, label=str(value), timeout=3000)
+
+                elif selector.startswith("input"):
+                    await page.fill(selector, str(value))
+            except Exception:
+                logging.exception(f"[{key}] Ошибка при заполнении {selector}")
+        scrape_steps.observe(time.perf_counter() - fill_started, step="fill")
+
+        try:
+            with scrape_steps.time(step="click"):
+                await page.click("#sbtn", timeout=10000)
+                await page.wait_for_load_state("networkidle")
+        except Exception as e:
+            logging.warning(f"[{key}] Ошибка при клике: {e}")
+            return None
+
+        with scrape_steps.time(step="parse"):
+            return [(await ad.inner_text(), await ad.get_attribute("href")) for ad in await page.query_selector_all("a.am")]
+
+
+    async def _process_ads(self, job: FilterJob, ads: list[tuple[str, str]]):
+        info, key = job.info, job.key
+        logging.info(f"key={key} | {info.get('name_car')} | attempt={job.attempt}")
+
+        ids = {ad_id_from_href(href): href for _, href in ads[:5] if href}
+        job.attempt += 1
+
+        if not seen_store.known(key):
+            seen_store.add(key, ids)
+            return None
+
+        new_ids = seen_store.filter_new(key, ids)
+        if not new_ids:
+            return None
+
+        new_ads = []
+        for ad_id in new_ids:
+            href = ids[ad_id]
+            logging.info(f"Новое объявление [{key}] | https://www.ss.com{href} |")
+
+            data = await generate_message(url=f'https://www.ss.com{href}')
+            if data.get("success", False):
+                new_ads.append(data)
+            else:
+                logging.warning(data.get("error"))
+
+        job.pending_seen = new_ids
+
+        return new_ads if new_ads else None
+
+
+async def generate_message(url: str) -> dict:
+    listing = await listing_cache.get(url)
+    if not listing.get("success"):
+        return {"success": False, "error": listing.get("error")}
+
+    return {
+        "success": True,
+        "url": url,
+        "image": listing["image"],
+        "message": listing["message"]
+    }
+
+
+# async def test():
+#     print(await generate_message(url="https://www.ss.com/msg/en/transport/cars/bmw/118/ccocjg.html"))
+
+
+# asyncio.run(test())
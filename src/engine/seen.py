@@ -0,0 +1,179 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from config import settings
+
+
+def ad_id_from_href(href: str) -> int:
+    """
+    /msg/en/transport/cars/bmw/118/ccocjg.html -> целое число.
+    Буквенный slug ss.com читается как биективное число по основанию 26,
+    всё остальное хэшируется в 63 бита.
+    """
+
+    slug = href.rstrip("/").rsplit("/", 1)[-1].split(".", 1)[0].lower()
+
+    if slug and slug.isascii() and slug.isalpha() and len(slug) <= 13:
+        value = 0
+        for char in slug:
+            value = value * 26 + (ord(char) - 96)
+        return value
+
+    digest = hashlib.blake2b(href.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") >> 1
+
+
+class SeenStore:
+    """
+    Просмотренные объявления по отпечатку фильтра в SQLite.
+    Переживает рестарты и правки фильтров, на каждый фильтр хранится не больше max_per_filter id.
+    Отпечатки без активности дольше ttl удаляются через sweep.
+    """
+
+    def __init__(self, path: str = "data_tasks/seen.db", max_per_filter: int = 200, ttl: float = 7 * 86400) -> None:
+        self.path = Path(path)
+        self.max_per_filter = max_per_filter
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self._cache: dict[str, set[int]] = {}
+        self._conn = None
+
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS queries (
+                    fingerprint TEXT PRIMARY KEY,
+                    created REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS seen (
+                    fingerprint TEXT NOT NULL,
+                    ad_id INTEGER NOT NULL,
+                    ts REAL NOT NULL,
+                    PRIMARY KEY (fingerprint, ad_id)
+                ) WITHOUT ROWID;
+                CREATE TABLE IF NOT EXISTS rates (
+                    fingerprint TEXT PRIMARY KEY,
+                    rate REAL NOT NULL,
+                    updated REAL NOT NULL
+                );
+            """)
+        return self._conn
+
+
+    def known(self, fingerprint: str) -> bool:
+        with self.lock:
+            if fingerprint in self._cache:
+                return True
+
+            row = self._connect().execute("SELECT 1 FROM queries WHERE fingerprint = ?", (fingerprint,)).fetchone()
+            if row:
+                self._load(fingerprint)
+            return row is not None
+
+
+    def _load(self, fingerprint: str) -> set[int]:
+        if fingerprint not in self._cache:
+            rows = self._connect().execute("SELECT ad_id FROM seen WHERE fingerprint = ?", (fingerprint,))
+            self._cache[fingerprint] = {ad_id for (ad_id,) in rows}
+        return self._cache[fingerprint]
+
+
+    def filter_new(self, fingerprint: str, ad_ids) -> list[int]:
+        with self.lock:
+            seen = self._load(fingerprint)
+            return [ad_id for ad_id in ad_ids if ad_id not in seen]
+
+
+    def add(self, fingerprint: str, ad_ids) -> None:
+        now = time.time()
+        ad_ids = list(ad_ids)
+
+        with self.lock:
+            conn = self._connect()
+            seen = self._load(fingerprint)
+
+            with conn:
+                conn.execute("INSERT OR IGNORE INTO queries (fingerprint, created) VALUES (?, ?)", (fingerprint, now))
+                conn.executemany(
+                    "INSERT OR REPLACE INTO seen (fingerprint, ad_id, ts) VALUES (?, ?, ?)",
+                    [(fingerprint, ad_id, now) for ad_id in ad_ids]
+                )
+                seen.update(ad_ids)
+
+                if len(seen) > self.max_per_filter:
+                    conn.execute("""
+                        DELETE FROM seen WHERE fingerprint = ? AND ad_id NOT IN (
+                            SELECT ad_id FROM seen WHERE fingerprint = ? ORDER BY ts DESC LIMIT ?
+                        )
+                    """, (fingerprint, fingerprint, self.max_per_filter))
+                    self._cache.pop(fingerprint, None)
+                    self._load(fingerprint)
+
+
+    def get_rate(self, fingerprint: str) -> float | None:
+        with self.lock:
+            row = self._connect().execute("SELECT rate FROM rates WHERE fingerprint = ?", (fingerprint,)).fetchone()
+            return row[0] if row else None
+
+
+    def set_rate(self, fingerprint: str, rate: float) -> None:
+        with self.lock:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO rates (fingerprint, rate, updated) VALUES (?, ?, ?)",
+                    (fingerprint, rate, time.time())
+                )
+
+
+    def forget(self, fingerprint: str) -> None:
+        with self.lock:
+            self._cache.pop(fingerprint, None)
+
+
+    def sweep(self, keep=()) -> int:
+        """
+        Удаляет отпечатки, которые не трогали дольше ttl, кроме keep
+        """
+
+        cutoff = time.time() - self.ttl
+        keep = set(keep)
+
+        with self.lock:
+            conn = self._connect()
+            rows = conn.execute("""
+                SELECT fingerprint, MAX(ts) FROM (
+                    SELECT fingerprint, created AS ts FROM queries
+                    UNION ALL SELECT fingerprint, updated FROM rates
+                    UNION ALL SELECT fingerprint, MAX(ts) FROM seen GROUP BY fingerprint
+                ) GROUP BY fingerprint
+            """).fetchall()
+            stale = [(fp,) for fp, ts in rows if ts < cutoff and fp not in keep]
+            if not stale:
+                return 0
+
+            with conn:
+                for table in ("seen", "rates", "queries"):
+                    conn.executemany(f"DELETE FROM {table} WHERE fingerprint = ?", stale)
+            for (fingerprint,) in stale:
+                self._cache.pop(fingerprint, None)
+
+        return len(stale)
+
+
+    def close(self) -> None:
+        with self.lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+seen_store = SeenStore(path=settings.node_path("seen.db"))
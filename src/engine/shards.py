@@ -0,0 +1,238 @@
+import time
+import logging
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+from src.engine.hashring import HashRing, ring_hash
+from src.database.store import FilterStore
+
+
+def shard_of(key: str, shards: int) -> int:
+    return ring_hash(key) % shards
+
+
+class LeaseBackend(ABC):
+    """
+    Хранилище аренды шардов. Реализация обязана делать claim атомарно:
+    шард достаётся узлу, только если он свободен, просрочен или уже его.
+    """
+
+    @abstractmethod
+    def heartbeat(self, node: str, ttl: float) -> None:
+        ...
+
+
+    @abstractmethod
+    def live_nodes(self) -> list[str]:
+        ...
+
+
+    @abstractmethod
+    def claim(self, node: str, shards: list[int], ttl: float) -> set[int]:
+        ...
+
+
+    @abstractmethod
+    def release(self, node: str, shards: list[int] | None = None) -> None:
+        ...
+
+
+    @abstractmethod
+    def owners(self) -> dict[int, str]:
+        ...
+
+
+class SqliteLeaseBackend(LeaseBackend):
+    """
+    Аренда в общем файле SQLite — для одной машины с несколькими узлами и для проверок
+    """
+
+    def __init__(self, path: str = "data_tasks/leases.db") -> None:
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self._conn = None
+
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=10, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS nodes (
+                    node TEXT PRIMARY KEY,
+                    expires REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS leases (
+                    shard INTEGER PRIMARY KEY,
+                    node TEXT NOT NULL,
+                    expires REAL NOT NULL
+                );
+            """)
+        return self._conn
+
+
+    def heartbeat(self, node: str, ttl: float) -> None:
+        with self.lock:
+            self._connect().execute(
+                "INSERT INTO nodes (node, expires) VALUES (?, ?) ON CONFLICT (node) DO UPDATE SET expires = excluded.expires",
+                (node, time.time() + ttl)
+            )
+
+
+    def live_nodes(self) -> list[str]:
+        with self.lock:
+            rows = self._connect().execute("SELECT node FROM nodes WHERE expires > ? ORDER BY node", (time.time(),)).fetchall()
+        return [node for node, in rows]
+
+
+    def claim(self, node: str, shards: list[int], ttl: float) -> set[int]:
+        now = time.time()
+        won = set()
+
+        with self.lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for shard in shards:
+                    cursor = conn.execute("""
+                        INSERT INTO leases (shard, node, expires) VALUES (?, ?, ?)
+                        ON CONFLICT (shard) DO UPDATE SET node = excluded.node, expires = excluded.expires
+                        WHERE leases.node = excluded.node OR leases.expires <= ?
+                    """, (shard, node, now + ttl, now))
+                    if cursor.rowcount:
+                        won.add(shard)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+        return won
+
+
+    def release(self, node: str, shards: list[int] | None = None) -> None:
+        with self.lock:
+            conn = self._connect()
+            if shards is None:
+                conn.execute("DELETE FROM leases WHERE node = ?", (node,))
+                conn.execute("DELETE FROM nodes WHERE node = ?", (node,))
+            else:
+                conn.executemany("DELETE FROM leases WHERE shard = ? AND node = ?", [(shard, node) for shard in shards])
+
+
+    def owners(self) -> dict[int, str]:
+        with self.lock:
+            rows = self._connect().execute("SELECT shard, node FROM leases WHERE expires > ?", (time.time(),)).fetchall()
+        return dict(rows)
+
+
+class FilterSource(ABC):
+    """
+    Откуда узел берёт активные фильтры при сверке своих шардов.
+    Источник общий для всех узлов: фильтр, которого узел не видит, никто не запустит.
+    """
+
+    @abstractmethod
+    def active(self) -> dict[int, dict[str, dict]]:
+        ...
+
+
+class SqliteFilterSource(FilterSource):
+    """
+    Активные фильтры прямо из filters.db бота — для узлов на той же машине
+    или на общем томе (FILTERS_DB). Для разных машин нужна своя реализация.
+    """
+
+    def __init__(self, path: str = "data_tasks/filters.db") -> None:
+        self.store = FilterStore(path=path)
+
+
+    def active(self) -> dict[int, dict[str, dict]]:
+        return self.store.active()
+
+
+class ShardCoordinator:
+    """
+    Узел держит аренду своей доли шардов: доля считается консистентным хэшем
+    по живым узлам, аренда продлевается heartbeat'ом. Шарды упавшего узла
+    освобождаются по истечении ttl и разбираются оставшимися узлами,
+    при появлении нового узла его доля отдаётся ему.
+    """
+
+    def __init__(self, backend: LeaseBackend, node: str, shards: int = 64,
+                 ttl: float = 30.0, interval: float = 10.0, on_change=None) -> None:
+        self.backend = backend
+        self.node = node
+        self.shards = shards
+        self.ttl = ttl
+        self.interval = interval
+        self.on_change = on_change
+
+        self.owned: set[int] = set()
+        self.nodes: list[str] = [node]
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stop_event = threading.Event()
+
+
+    def owns(self, key: str) -> bool:
+        with self.lock:
+            return shard_of(key, self.shards) in self.owned
+
+
+    def tick(self) -> tuple[set[int], set[int]]:
+        self.backend.heartbeat(self.node, self.ttl)
+
+        self.nodes = self.backend.live_nodes() or [self.node]
+        ring = HashRing(self.nodes)
+        desired = {shard for shard in range(self.shards) if ring.get(str(shard)) == self.node}
+
+        with self.lock:
+            previous = set(self.owned)
+
+        surplus = previous - desired
+        if surplus:
+            self.backend.release(self.node, sorted(surplus))
+
+        owned = self.backend.claim(self.node, sorted(desired), self.ttl)
+
+        with self.lock:
+            self.owned = owned
+
+        gained, lost = owned - previous, previous - owned
+        if gained or lost:
+            logging.info(f"[Shards] {self.node}: +{len(gained)} -{len(lost)}, всего {len(owned)}/{self.shards}")
+        return gained, lost
+
+
+    def start(self) -> None:
+        if self.thread and self.thread.is_alive():
+            return
+
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name="ShardCoordinator", daemon=True)
+        self.thread.start()
+
+
+    def _run(self) -> None:
+        while not self.stop_event.is_set():
+            try:
+                gained, lost = self.tick()
+                if self.on_change:
+                    self.on_change(gained, lost)
+            except Exception as e:
+                logging.error(f"[Shards] Ошибка heartbeat: {e}", exc_info=True)
+
+            self.stop_event.wait(self.interval)
+
+
+    def stop(self) -> None:
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout=self.interval)
+        self.backend.release(self.node)
+
+        with self.lock:
+            self.owned = set()
@@ -0,0 +1,295 @@
+import time
+import queue
+import asyncio
+import logging
+import itertools
+import threading
+import multiprocessing as mp
+
+from config import settings
+from src.engine.search import SearchEngine, job_key
+from src.engine.hashring import HashRing
+from src.engine.delivery import DeliveryService
+from src.engine.outbox import outbox
+from src.engine.photos import photo_cache
+from src.utils.session import http_pool
+from src.utils.metrics import registry
+
+
+def worker_main(name: str, commands, results, report_interval: float = 5.0, ack_timeout: float = 30.0) -> None:
+    """
+    Процесс-воркер: свой SearchEngine без доставки, найденные объявления
+    уходят обратно в процесс бота через очередь results. sink ждёт подтверждения,
+    что объявление записано в outbox, и только потом движок помечает его просмотренным.
+    """
+
+    logging.basicConfig(level=settings.LOGGING_LEVEL, format=f"%(asctime)s [{name}] %(levelname)s %(message)s")
+    if settings.METRICS_PORT:
+        registry.serve(settings.METRICS_PORT + 1 + int(name.rsplit("-", 1)[1]))
+
+    acks: dict[int, asyncio.Future] = {}
+    tokens = itertools.count()
+
+    async def sink(chat_id: int, data: dict) -> bool:
+        token = next(tokens)
+        acks[token] = asyncio.get_running_loop().create_future()
+        results.put(("deliver", name, token, chat_id, data))
+
+        try:
+            return await asyncio.wait_for(acks[token], ack_timeout)
+        finally:
+            acks.pop(token, None)
+
+    def resolve(token: int, queued: bool, error: str | None) -> None:
+        future = acks.get(token)
+        if future is None or future.done():
+            return
+        if error:
+            future.set_exception(RuntimeError(f"outbox: {error}"))
+        else:
+            future.set_result(queued)
+
+    engine = SearchEngine(sink=sink)
+    engine.start()
+    reported = time.monotonic()
+
+    while True:
+        if time.monotonic() - reported >= report_interval:
+            results.put(("attempts", name, engine.get_attempts()))
+            reported = time.monotonic()
+
+        try:
+            command = commands.get(timeout=max(0.0, reported + report_interval - time.monotonic()))
+        except queue.Empty:
+            continue
+
+        if command is None:
+            break
+
+        op, *args = command
+        try:
+            if op == "add":
+                engine.add_filter(*args)
+            elif op == "update":
+                engine.update_filter(*args)
+            elif op == "remove":
+                engine.remove_filter(*args)
+            elif op == "ack":
+                engine.loop.call_soon_threadsafe(resolve, *args)
+        except Exception as e:
+            logging.error(f"[{name}] Ошибка команды {op}: {e}", exc_info=True)
+
+    engine.stop()
+    if engine.thread:
+        engine.thread.join(timeout=10)
+
+
+class WorkerPool:
+    """
+    Бот и N процессов-скраперов. Фильтры раскладываются по воркерам консистентным
+    хэшем ключа задачи, так что одинаковые фильтры попадают в один процесс и там
+    схлопываются. Доставка, outbox и кэш фото остаются в процессе бота.
+    """
+
+    def __init__(self, workers: int, mode: str | None = None) -> None:
+        self.mode = mode or settings.SEARCH_MODE
+        self.names = [f"scraper-{i}" for i in range(workers)]
+        self.ring = HashRing(self.names)
+        self.delivery = DeliveryService()
+
+        self.lock = threading.Lock()
+        self.filters: dict[str, tuple[int, dict, str]] = {}
+        self.attempts: dict[str, int] = {}
+
+        self.ctx = mp.get_context("spawn")
+        self.results = None
+        self.commands: dict[str, mp.Queue] = {}
+        self.processes: dict[str, mp.Process] = {}
+        self.spawned: dict[str, float] = {}
+        self.restart_delay = 5.0
+
+        self.loop = None
+        self.thread = None
+        self.stop_event = threading.Event()
+        self._tasks: set[asyncio.Task] = set()
+
+        registry.lazy("active_filters", "Filters assigned to scraper workers", lambda: len(self.filters))
+        registry.lazy("scraper_workers_alive", "Live scraper worker processes", lambda: sum(1 for p in self.processes.values() if p.is_alive()))
+
+
+    def start(self) -> None:
+        with self.lock:
+            if self.thread and self.thread.is_alive():
+                return
+
+            self.stop_event.clear()
+            self.results = self.ctx.Queue()
+            for name in self.names:
+                self._spawn(name)
+
+            self.loop = asyncio.new_event_loop()
+            self.thread = threading.Thread(target=self._run, name="WorkerPool", daemon=True)
+            self.thread.start()
+
+
+    def _spawn(self, name: str) -> None:
+        self.commands[name] = self.ctx.Queue()
+        process = self.ctx.Process(target=worker_main, args=(name, self.commands[name], self.results), name=name, daemon=True)
+        process.start()
+        self.processes[name] = process
+        self.spawned[name] = time.monotonic()
+
+        for key, (uid, info, owner) in self.filters.items():
+            if owner == name:
+                self.commands[name].put(("add", uid, key, info))
+
+
+    def stop(self) -> None:
+        self.stop_event.set()
+
+        for name, commands in self.commands.items():
+            commands.put(None)
+        for process in self.processes.values():
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+
+        if self.thread:
+            self.thread.join(timeout=10)
+
+
+    def _send(self, name: str, command: tuple) -> None:
+        if name in self.commands:
+            self.commands[name].put(command)
+
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self.loop)
+
+        try:
+            self.loop.run_until_complete(self._main())
+        except Exception as e:
+            logging.error(f"[WorkerPool] Ошибка в run: {e}", exc_info=True)
+        finally:
+            self.loop.close()
+
+
+    async def _main(self) -> None:
+        tasks = [asyncio.create_task(outbox.run()), asyncio.create_task(self.delivery.run())]
+
+        try:
+            await self._pump()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await http_pool.close()
+            photo_cache.close()
+            outbox.close()
+
+
+    async def _pump(self) -> None:
+        while not self.stop_event.is_set():
+            try:
+                message = await asyncio.to_thread(self.results.get, True, 1.0)
+            except queue.Empty:
+                self._check_workers()
+                continue
+
+            kind, *payload = message
+            if kind == "deliver":
+                task = asyncio.create_task(self._deliver(*payload))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+            elif kind == "attempts":
+                _, attempts = payload
+                with self.lock:
+                    self.attempts.update(attempts)
+
+
+    async def _deliver(self, name: str, token: int, chat_id: int, data: dict) -> None:
+        """
+        Воркер получает ответ только после коммита в outbox
+        """
+
+        try:
+            queued = await self.delivery.enqueue(chat_id=chat_id, data=data)
+            ack = ("ack", token, queued, None)
+        except Exception as e:
+            logging.warning(f"[WorkerPool] Объявление от {name} не записано в outbox: {e}")
+            ack = ("ack", token, False, str(e) or type(e).__name__)
+
+        with self.lock:
+            self._send(name, ack)
+
+
+    def _check_workers(self) -> None:
+        with self.lock:
+            for name, process in list(self.processes.items()):
+                if process.is_alive() or self.stop_event.is_set():
+                    continue
+                if time.monotonic() - self.spawned[name] >= self.restart_delay:
+                    logging.warning(f"[WorkerPool] {name} завершился с кодом {process.exitcode}, перезапуск")
+                    self._spawn(name)
+
+
+    def add_filter(self, uid: int, key: str, info: dict) -> None:
+        with self.lock:
+            if key in self.filters:
+                return
+            owner = self.ring.get(job_key(info, self.mode))
+            self.filters[key] = (uid, dict(info), owner)
+            self._send(owner, ("add", uid, key, dict(info)))
+
+
+    def update_filter(self, new_filter: dict) -> None:
+        with self.lock:
+            for key, value in new_filter.items():
+                if key not in self.filters:
+                    continue
+
+                uid, info, owner = self.filters[key]
+                info = {**info, **value} if isinstance(value, dict) else value
+                new_owner = self.ring.get(job_key(info, self.mode))
+                self.filters[key] = (uid, info, new_owner)
+
+                if new_owner == owner:
+                    self._send(owner, ("update", {key: value}))
+                else:
+                    self._send(owner, ("remove", key))
+                    self._send(new_owner, ("add", uid, key, info))
+
+
+    def has_filter(self, key: str) -> bool:
+        with self.lock:
+            return key in self.filters
+
+
+    def remove_filter(self, key: str) -> bool:
+        with self.lock:
+            if key not in self.filters:
+                return False
+            _, _, owner = self.filters.pop(key)
+            self.attempts.pop(key, None)
+            self._send(owner, ("remove", key))
+
+        return True
+
+
+    def remove_user(self, uid: int) -> list[str]:
+        with self.lock:
+            keys = [key for key, (filter_uid, _, _) in self.filters.items() if filter_uid == uid]
+
+        for key in keys:
+            self.remove_filter(key)
+        return keys
+
+
+    def snapshot(self) -> dict[str, tuple[int, dict]]:
+        with self.lock:
+            return {key: (uid, dict(info)) for key, (uid, info, _) in self.filters.items()}
+
+
+    def get_filters(self, uid: int) -> dict[str, int]:
+        with self.lock:
+            return {key: self.attempts.get(key, 0) for key, (filter_uid, _, _) in self.filters.items() if filter_uid == uid}
@@ -1,5 +1,3 @@
-import json
-from pathlib import Path
 from urllib.parse import urlparse
 
 from aiogram import F
@@ -11,9 +9,11 @@ from aiogram.types import Message, CallbackQuery
 from src.core.bot import SettingsBot
 from src.keyboards.callbackdata import *
 from src.keyboards.inline import Ikb as IKB
+from src.keyboards.ids import short_ids
 
 from request import *
 from manager import thread_manager
+from src.database.repository import filter_repository
 
 
 class EditFilterCar(StatesGroup):
@@ -34,6 +34,7 @@ class EditFiltersHandlers:
 
         self.dp.callback_query(F.data == 'edit_model')(self.edit_model)
         self.dp.callback_query(ModelsCallback.filter(F.action == 'edit_model'))(self.get_new_model)
+        self.dp.callback_query(PageCallback.filter(F.menu == 'edit_models'))(self.get_models_page)
 
         self.dp.callback_query(F.data == 'edit_typengines')(self.edit_typegines)
         self.dp.callback_query(TypengineCallback.filter(F.action == 'edit_typengine'))(self.get_new_typengines)
@@ -59,59 +60,9 @@ class EditFiltersHandlers:
         self.dp.callback_query(F.data == 'edit_max_price')(self.edit_max_price)
         self.dp.message(StateFilter(F.text.isdigit(), EditFilterCar.MAX_PRICE))(self.get_new_max_price)
 
-    
-    def _load_db(self, path: str = "data_tasks/cars.json") -> dict:
-        try:
-            with open(Path(path), "r", encoding="utf-8") as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError): return {}
-
-    
-    def update_json_cars(self, filter_id: str, new_data: dict, uid: int, path: str = "data_tasks/cars.json") -> dict:
-        db = self._load_db()
-        record = db.get(filter_id, {})
-
-        for k, v in new_data.items():
-            if v in (None, "", 0):
-                record.pop(k, None)
-            else:
-                record[k] = v
-
-        db[filter_id] = record
-
-        with open(Path(path), "w", encoding="utf-8") as f:
-            json.dump(db, f, ensure_ascii=False, indent=4)
-
-        return db
-
-
-    def update_json_threads(self, filter_id: str, new_data: dict, uid: int, path: str = "data_tasks/active_threads.json"):
-        db = self._load_db(path=path)
-
-        user_filters = db.get(str(uid), [])
-        for item in user_filters:
-            if filter_id in item:
-                record = item[filter_id]
-
-                for k, v in new_data.items():
-                    if v in (None, "", 0):
-                        record.pop(k, None)
-                    else:
-                        record[k] = v
-
-                item[filter_id] = record
-                break
-
-        db[str(uid)] = user_filters
-
-        with open(Path(path), "w", encoding="utf-8") as f:
-            json.dump(db, f, ensure_ascii=False, indent=4)
-
 
     async def edit_filter(self, call: CallbackQuery, callback_data: FiltersCallback, state: FSMContext) -> Message:
-        db = self._load_db()
-
-        filter_data = db.get(callback_data.filter_id)
+        filter_data = filter_repository.get(callback_data.filter_id)
         await state.update_data(filter_data=filter_data, filter_id=callback_data.filter_id)
         
         return await call.message.edit_text(f'You selected: {filter_data.get("name_car")}. Select what you want to change.', reply_markup=await IKB.edit_filter_menu(
@@ -192,6 +143,21 @@ class EditFiltersHandlers:
             )
 
 
+    async def get_models_page(self, call: CallbackQuery, callback_data: PageCallback, state: FSMContext) -> Message:
+        await call.answer()
+
+        data = await state.get_data()
+        filter_data = data.get('filter_data', {})
+
+        return await call.message.edit_reply_markup(reply_markup=await IKB.models_buttons_edit_menu(
+                models=data.get('models', []),
+                filter_id=data.get('filter_id'),
+                current_model=filter_data.get('model') or '<i>Not selected</i>',
+                page=callback_data.page
+            )
+        )
+
+
     async def get_new_model(self, call: CallbackQuery, callback_data: ModelsCallback, state: FSMContext) -> Message:
         await call.answer('')
 
@@ -201,49 +167,41 @@ class EditFiltersHandlers:
         filter_data = data.get('filter_data', {})
         car = filter_data.get('name_car')
         model = filter_data.get('model', None)
+        new_model = short_ids.resolve(callback_data.model_id, models)
 
         selected_models = None
-        if car in ("BMW", "Mercedes") and callback_data.model:
+        if car in ("BMW", "Mercedes") and new_model:
             models_search = await get_models(url=filter_data.get('url'))
             if models_search:
-                selected = models_search.get(callback_data.model)
+                selected = models_search.get(new_model)
                 if selected:
                     selected_models = selected
                 else:
-                    selected_models = callback_data.model if callback_data.model != model else None
+                    selected_models = new_model if new_model != model else None
 
-        if callback_data.model == model:
+        if new_model == model:
             return
 
-        new_data = {"models": selected_models or callback_data.model, "model": callback_data.model}
+        new_data = {"models": selected_models or new_model, "model": new_model}
 
-        self.update_json_cars(
-            new_data=new_data,
-            uid=call.from_user.id,
-            filter_id=filter_id
-        )
-        self.update_json_threads(
-            new_data=new_data,
-            uid=call.from_user.id,
-            filter_id=filter_id
-        )
+        filter_repository.update(filter_id=filter_id, new_data=new_data)
 
         thread_manager.update_filter(uid=call.from_user.id, new_filter={filter_id: new_data})
 
-        filter_data["models"] = selected_models or callback_data.model
-        filter_data["model"] = callback_data.model
+        filter_data["models"] = selected_models or new_model
+        filter_data["model"] = new_model
         await state.update_data(filter_data=filter_data)
 
         text = (
             f"🚘 <b>Brand:</b> {filter_data.get('name_car', '<i>Not selected</i>')}\n"
-            f"📍 <b>Current model:</b> {callback_data.model or '<i>Not selected</i>'}\n\n"
+            f"📍 <b>Current model:</b> {new_model or '<i>Not selected</i>'}\n\n"
             f"➡️ <u>Please select a new model</u>:"
         )
 
         return await call.message.edit_text(text, reply_markup=await IKB.models_buttons_edit_menu(
                 models=models,
                 filter_id=filter_id,
-                current_model=callback_data.model or "<i>Not selected</i>"
+                current_model=new_model or "<i>Not selected</i>"
             )
         )
 
@@ -286,16 +244,7 @@ class EditFiltersHandlers:
 
         new_data = {"typengines": filter_typengines}
 
-        self.update_json_cars(
-            new_data=new_data,
-            uid=call.from_user.id,
-            filter_id=filter_id
-        )
-        self.update_json_threads(
-            new_data=new_data,
-            uid=call.from_user.id,
-            filter_id=filter_id
-        )
+        filter_repository.update(filter_id=filter_id, new_data=new_data)
 
         thread_manager.update_filter(uid=call.from_user.id, new_filter={filter_id: new_data})
 
@@ -354,16 +303,7 @@ class EditFiltersHandlers:
         
         new_data = {"min_year": callback_data.year}
 
-        self.update_json_cars(
-            new_data=new_data,
-            uid=call.from_user.id,
-            filter_id=filter_id
-        )
-        self.update_json_threads(
-            new_data=new_data,
-            uid=call.from_user.id,
-            filter_id=filter_id
-        )
+        filter_repository.update(filter_id=filter_id, new_data=new_data)
 
         thread_manager.update_filter(uid=call.from_user.id, new_filter={filter_id: new_data})
 
@@ -422,16 +362,7 @@ class EditFiltersHandlers:
 
         new_data = {"max_year": callback_data.year}
         
-        self.update_json_cars(
-            new_data=new_data,
-            uid=call.from_user.id,
-            filter_id=filter_id
-        )
-        self.update_json_threads(
-            new_data=new_data,
-            uid=call.from_user.id,
-            filter_id=filter_id
-        )
+        filter_repository.update(filter_id=filter_id, new_data=new_data)
 
         thread_manager.update_filter(uid=call.from_user.id, new_filter={filter_id: new_data})
 
@@ -490,16 +421,7 @@ class EditFiltersHandlers:
 
         new_data = {"min_displacement": callback_data.displacement}
         
-        self.update_json_cars(
-            new_data=new_data,
-            uid=call.from_user.id,
-            filter_id=filter_id
-        )
-        self.update_json_threads(
-            new_data=new_data,
-            uid=call.from_user.id,
-            filter_id=filter_id
-        )
+        filter_repository.update(filter_id=filter_id, new_data=new_data)
 
         thread_manager.update_filter(uid=call.from_user.id, new_filter={filter_id: new_data})
 
@@ -561,16 +483,7 @@ class EditFiltersHandlers:
 
         new_data = {"max_displacement": callback_data.displacement}
         
-        self.update_json_cars(
-            new_data=new_data,
-            uid=call.from_user.id,
-            filter_id=filter_id
-        )
-        self.update_json_threads(
-            new_data=new_data,
-            uid=call.from_user.id,
-            filter_id=filter_id
-        )
+        filter_repository.update(filter_id=filter_id, new_data=new_data)
 
         thread_manager.update_filter(uid=call.from_user.id, new_filter={filter_id: new_data})
 
@@ -628,16 +541,7 @@ class EditFiltersHandlers:
 
         new_data = {"gearbox": callback_data.gearbox}
         
-        self.update_json_cars(
-            new_data=new_data,
-            uid=call.from_user.id,
-            filter_id=filter_id
-        )
-        self.update_json_threads(
-            new_data=new_data,
-            uid=call.from_user.id,
-            filter_id=filter_id
-        )
+        filter_repository.update(filter_id=filter_id, new_data=new_data)
 
         thread_manager.update_filter(uid=call.from_user.id, new_filter={filter_id: new_data})
 
@@ -695,16 +599,7 @@ class EditFiltersHandlers:
 
         new_data = {"bodytypes": filter_bodytypes}
 
-        self.update_json_cars(
-            new_data=new_data,
-            uid=call.from_user.id,
-            filter_id=filter_id
-        )
-        self.update_json_threads(
-            new_data=new_data,
-            uid=call.from_user.id,
-            filter_id=filter_id
-        )
+        filter_repository.update(filter_id=filter_id, new_data=new_data)
 
         thread_manager.update_filter(uid=call.from_user.id, new_filter={filter_id: new_data})
 
@@ -743,16 +638,7 @@ class EditFiltersHandlers:
 
         new_data = {"min_price": int(m.text)}
 
-        self.update_json_cars(
-            new_data=new_data,
-            uid=m.from_user.id,
-            filter_id=filter_id
-        )
-        self.update_json_threads(
-            new_data=new_data,
-            uid=m.from_user.id,
-            filter_id=filter_id
-        )
+        filter_repository.update(filter_id=filter_id, new_data=new_data)
 
         thread_manager.update_filter(uid=m.from_user.id, new_filter={filter_id: new_data})
 
@@ -791,16 +677,7 @@ class EditFiltersHandlers:
 
         new_data = {"max_price": int(m.text)}
 
-        self.update_json_cars(
-            new_data=new_data,
-            uid=m.from_user.id,
-            filter_id=filter_id
-        )
-        self.update_json_threads(
-            new_data=new_data,
-            uid=m.from_user.id,
-            filter_id=filter_id
-        )
+        filter_repository.update(filter_id=filter_id, new_data=new_data)
 
         thread_manager.update_filter(uid=m.from_user.id, new_filter={filter_id: new_data})
 
@@ -1,6 +1,3 @@
-import json
-from pathlib import Path
-
 from aiogram import F
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
@@ -11,6 +8,7 @@ from src.keyboards.callbackdata import *
 from src.keyboards.inline import Ikb as IKB
 
 from manager import thread_manager
+from src.database.repository import filter_repository
 
 
 class SearchHandlers:
@@ -35,18 +33,10 @@ class SearchHandlers:
         self.dp.callback_query(FiltersCallback.filter(F.action == 'on_filter'))(self.filter_turn_on)
         self.dp.callback_query(FiltersCallback.filter(F.action == 'off_filter'))(self.filter_turn_off)
 
-    
-    def _load_db(self) -> dict:
-        try:
-            with open(Path('data_tasks/cars.json'), "r", encoding="utf-8") as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError): return {}
 
 
     async def command_search_start(self, m: Message) -> Message:
-        db = self._load_db()
-
-        filtered = {k: v for k, v in db.items() if v.get("uid") == m.from_user.id}
+        filtered = filter_repository.by_uid(uid=m.from_user.id)
         if not filtered:
             return await m.answer("<b>Not found filters!</b>")
 
@@ -63,9 +53,8 @@ class SearchHandlers:
     
     async def get_filters(self, call: CallbackQuery, state: FSMContext) -> Message:
         await state.clear()
-        db = self._load_db()
 
-        filtered_cars = [(k, v.get("name_car"), v.get("model")) for k, v in db.items() if v.get("uid") == call.from_user.id]
+        filtered_cars = [(k, v.get("name_car"), v.get("model")) for k, v in filter_repository.by_uid(uid=call.from_user.id).items()]
         if not filtered_cars:
             return await call.answer("You don't have filters!")
 
@@ -73,9 +62,8 @@ class SearchHandlers:
 
     
     async def get_filter(self, call: CallbackQuery, callback_data: FiltersCallback) -> Message:
-        db = self._load_db()
         filter_id = callback_data.filter_id
-        data = db.get(filter_id)
+        data = filter_repository.get(filter_id)
 
         selectors = {
             "name_car": "🚙 <b>{}</b>",
@@ -128,25 +116,7 @@ class SearchHandlers:
         filter_id = callback_data.filter_id 
         uid = call.from_user.id    
 
-        try:
-            with open(Path('data_tasks/active_threads.json'), "r", encoding="utf-8") as f:
-                db1 = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError): db1 = {}
-
-        if str(uid) in db1:
-            db1[str(uid)] = [entry for entry in db1[str(uid)] if filter_id not in entry]
-            with open(Path('data_tasks/active_threads.json'), "w", encoding="utf-8") as f:
-                json.dump(db1, f, ensure_ascii=False, indent=4)
-
-        try:
-            with open(Path('data_tasks/cars.json'), "r", encoding="utf-8") as f:
-                db2 = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError): db2 = {}
-
-        if filter_id in db2:
-            del db2[filter_id]
-            with open(Path('data_tasks/cars.json'), "w", encoding="utf-8") as f:
-                json.dump(db2, f, ensure_ascii=False, indent=4)
+        filter_repository.delete(filter_id)
 
         thread_manager.remove_filter(uid=uid, key=filter_id)
         await state.clear()
@@ -163,9 +133,9 @@ class SearchHandlers:
 
     
     async def filter_turn_on(self, call: CallbackQuery, callback_data: FiltersCallback) -> Message:
-        db = self._load_db()
+        data = filter_repository.get(callback_data.filter_id)
 
-        thread_manager.start_threads(data_search={callback_data.filter_id: db[callback_data.filter_id]}, uid=call.from_user.id)
+        thread_manager.start_threads(data_search={callback_data.filter_id: data}, uid=call.from_user.id)
 
         return await call.message.edit_reply_markup(reply_markup=await IKB.filter_menu(filter_id=callback_data.filter_id, uid=call.from_user.id))
     
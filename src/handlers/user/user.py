@@ -1,6 +1,4 @@
-import json
-import uuid
-from pathlib import Path
+import asyncio
 
 from aiogram import F
 from aiogram.fsm.context import FSMContext
@@ -11,9 +9,11 @@ from aiogram.types import Message, CallbackQuery, FSInputFile
 from src.core.bot import SettingsBot
 from src.keyboards.inline import Ikb as IKB
 from src.keyboards.callbackdata import *
+from src.keyboards.ids import short_ids
 
 from request import *
 from manager import thread_manager
+from src.database.repository import filter_repository
 
 
 base_url = 'https://www.ss.com'
@@ -29,6 +29,7 @@ class ClientHandlers:
         self.bot = module.bot
         self.dp = module.dp
         self.cfg = module.config
+        self._prefetches: set[asyncio.Task] = set()
 
 
     async def register_handlers(self):
@@ -36,6 +37,8 @@ class ClientHandlers:
         self.dp.callback_query(F.data == 'cars', StateFilter("*"))(self.get_cars)
         self.dp.callback_query(CarsCallback.filter(F.action == 'car'))(self.get_car)
         self.dp.callback_query(ModelsCallback.filter(F.action == 'car_models'))(self.get_model)
+        self.dp.callback_query(PageCallback.filter(F.menu.in_({'cars', 'models'})))(self.get_page)
+        self.dp.callback_query(F.data == 'noop', StateFilter("*"))(self.noop)
         self.dp.callback_query(YearsCallback.filter(F.action == 'car_years_min'))(self.get_year_min)
         self.dp.callback_query(YearsCallback.filter(F.action == 'car_years_max'))(self.get_year_max)
         self.dp.callback_query(DisplacementCallback.filter(F.action == 'min_displacement'))(self.get_displacement_min)
@@ -51,6 +54,12 @@ class ClientHandlers:
         self.dp.callback_query(F.data == 'approve', StateFilter("*"))(self.approve)
 
 
+    def prefetch(self, url: str, groups: bool = False) -> None:
+        task = asyncio.create_task(prefetch_brand(url=url, groups=groups))
+        self._prefetches.add(task)
+        task.add_done_callback(self._prefetches.discard)
+
+
     async def command_start(self, m: Message, state: FSMContext) -> Message:
         return await m.answer("Hello! 👋\n\nWelcome to the bot for finding ads!", reply_markup=await IKB.main_menu())
 
@@ -65,15 +74,39 @@ class ClientHandlers:
         return await call.message.edit_text("<b>Select car:</b>", reply_markup=await IKB.cars_buttons_menu(list_cars=list_cars))
 
 
+    async def get_page(self, call: CallbackQuery, callback_data: PageCallback, state: FSMContext) -> Message:
+        await call.answer()
+
+        if callback_data.menu == 'cars':
+            markup = await IKB.cars_buttons_menu(list_cars=await get_list_cars(), page=callback_data.page)
+        else:
+            data = await state.get_data()
+            markup = await IKB.models_buttons_menu(models=data.get("model_options", []), url=data.get("url"), page=callback_data.page)
+
+        return await call.message.edit_reply_markup(reply_markup=markup)
+
+
+    async def noop(self, call: CallbackQuery) -> None:
+        await call.answer()
+
+
     async def get_car(self, call: CallbackQuery, callback_data: CarsCallback, state: FSMContext) -> Message:
-        name_car = callback_data.name_car
+        car = short_ids.resolve(callback_data.car_id)
+        if car is None:
+            list_cars = await get_list_cars()
+            car = short_ids.resolve(callback_data.car_id, [(c.get('car'), c.get('url')) for c in list_cars])
+        if car is None:
+            return await self.get_cars(call=call, state=state)
+
+        name_car, url_car = car
         await state.update_data(
             data={
                 "uid": call.from_user.id,
                 "name_car": name_car,
-                "url": f"{base_url}{callback_data.url_car}"
+                "url": f"{base_url}{url_car}"
             }
         )
+        self.prefetch(url=f"{base_url}{url_car}", groups=name_car in ("BMW", "Mercedes"))
 
         car_map = {
             "BMW": [
@@ -92,28 +125,31 @@ class ClientHandlers:
 
         if name_car in car_map:
             models = car_map[name_car]
+            await state.update_data(model_options=models)
             text = (
                 f"🚘 <b>{name_car}</b>\n\n"
                 f"<i>Here are the available models:</i>\n"
                 f"➡️ <u>Select one below</u>:"
             )
-            return await call.message.edit_text(text, reply_markup=await IKB.models_buttons_menu(models=models))
+            return await call.message.edit_text(text, reply_markup=await IKB.models_buttons_menu(models=models, url=f"{base_url}{url_car}"))
 
-        models_cars = await get_models_cars(url=f"{base_url}{callback_data.url_car}search/")
+        models_cars = await get_models_cars(url=f"{base_url}{url_car}search/")
         if not models_cars:
             return await call.message.edit_text("❌ <b>No models found</b>")
 
+        await state.update_data(model_options=models_cars)
+
         text = (
             f"🚗 <b>{name_car}</b>\n\n"
             f"<i>Here are the available models:</i>\n"
             f"➡️ <u>Select one below</u>:"
         )
-        return await call.message.edit_text(text, reply_markup=await IKB.models_buttons_menu(models=models_cars))
+        return await call.message.edit_text(text, reply_markup=await IKB.models_buttons_menu(models=models_cars, url=f"{base_url}{url_car}"))
 
     
     async def get_model(self, call: CallbackQuery, callback_data: ModelsCallback, state: FSMContext) -> Message:
         data = await state.get_data()
-        model_name = callback_data.model
+        model_name = short_ids.resolve(callback_data.model_id, data.get("model_options", []))
         car = data.get("name_car")
         base_url = data.get("url")
 
@@ -142,7 +178,7 @@ class ClientHandlers:
             f"📅 <u>Please select a minimum year</u>:"
         )
 
-        return await call.message.edit_text(text, reply_markup=await IKB.years_buttons_menu(years=years, action="car_years_min"))
+        return await call.message.edit_text(text, reply_markup=await IKB.years_buttons_menu(years=years, action="car_years_min", url=base_url))
 
     
     async def get_year_min(self, call: CallbackQuery, callback_data: YearsCallback,  state: FSMContext) -> Message:
@@ -184,7 +220,7 @@ class ClientHandlers:
             f"⚙️ <u>Please select the engine displacement</u>:"
         )
 
-        return await call.message.edit_text(text, reply_markup=await IKB.displacement_buttons_menu(displacements=displacements, action="min_displacement"))
+        return await call.message.edit_text(text, reply_markup=await IKB.displacement_buttons_menu(displacements=displacements, action="min_displacement", url=data.get("url")))
     
 
     async def get_displacement_min(self, call: CallbackQuery, callback_data: DisplacementCallback, state: FSMContext) -> Message:
@@ -234,7 +270,7 @@ class ClientHandlers:
             f"➡️ <u>Please select the engine type</u> (or skip this step):"
         )
 
-        return await call.message.edit_text(text, reply_markup=await IKB.typengine_buttons_menu(typengines=typengines, selected_typengines=None))
+        return await call.message.edit_text(text, reply_markup=await IKB.typengine_buttons_menu(typengines=typengines, url=data.get("url"), selected_typengines=None))
 
 
     async def get_typengine(self, call: CallbackQuery, callback_data: TypengineCallback, state: FSMContext) -> Message:
@@ -262,7 +298,7 @@ class ClientHandlers:
                 f"➡️ <u>Please select the engine type</u> (or skip this step):"
             )
 
-            return await call.message.edit_text(text, reply_markup=await IKB.typengine_buttons_menu(typengines=all_typengines, selected_typengines=typengines))
+            return await call.message.edit_text(text, reply_markup=await IKB.typengine_buttons_menu(typengines=all_typengines, url=data.get("url"), selected_typengines=typengines))
 
         else:
             await state.update_data(all_typengines=None)
@@ -282,7 +318,7 @@ class ClientHandlers:
                 f"⚙️ <u>Select the type of gearbox</u> (or skip this step):"
             )
 
-            return await call.message.edit_text(text, reply_markup=await IKB.gerabox_buttons_menu(geraboxes=gearbox))
+            return await call.message.edit_text(text, reply_markup=await IKB.gerabox_buttons_menu(geraboxes=gearbox, url=data.get("url")))
 
     
     async def get_gerabox(self, call: CallbackQuery, callback_data: GearboxCallback, state: FSMContext) -> Message:
@@ -309,7 +345,7 @@ class ClientHandlers:
             f"➡️ <u>Please select the body type</u> (or skip this step):"
         )
 
-        return await call.message.edit_text(text, reply_markup=await IKB.bodytype_buttons_menu(bodytypes=bodytype, selected_bodytypes=None))
+        return await call.message.edit_text(text, reply_markup=await IKB.bodytype_buttons_menu(bodytypes=bodytype, url=data.get("url"), selected_bodytypes=None))
 
     
     async def get_bodytype(self, call: CallbackQuery, callback_data: GearboxCallback, state: FSMContext) -> Message:
@@ -331,7 +367,7 @@ class ClientHandlers:
                 f"➡️ <u>Please select the type of inspection</u> (or skip this step):"
             )
 
-            return await call.message.edit_text(text, reply_markup=await IKB.bodytype_buttons_menu(bodytypes=all_bodytypes, selected_bodytypes=bodytypes))
+            return await call.message.edit_text(text, reply_markup=await IKB.bodytype_buttons_menu(bodytypes=all_bodytypes, url=data.get("url"), selected_bodytypes=bodytypes))
 
         else:
             inspections = await get_inspection(url=f"{data.get('url', None)}search/")
@@ -345,7 +381,7 @@ class ClientHandlers:
                 f"➡️ <u>Please select the type of inspection</u> (or skip this step):"
             )
 
-            return await call.message.edit_text(text, reply_markup=await IKB.inspection_buttons_menu(inspections=inspections))
+            return await call.message.edit_text(text, reply_markup=await IKB.inspection_buttons_menu(inspections=inspections, url=data.get("url")))
 
 
     async def get_inspection(self, call: CallbackQuery, callback_data: GearboxCallback, state: FSMContext) -> Message:
@@ -410,20 +446,10 @@ class ClientHandlers:
     async def approve(self, call: CallbackQuery, state: FSMContext) -> Message:
         data = await state.get_data()
 
-        file_path = Path("data_tasks/cars.json")
-        if file_path.exists():
-            with open(file_path, "r", encoding="utf-8") as f:
-                db = json.load(f)
-        else:
-            db = {}
-
-        record_id = str(uuid.uuid4())
-        db[record_id] = {k: v for k, v in data.items() if v is not None}
-
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(db, f, ensure_ascii=False, indent=4)
+        record = {k: v for k, v in data.items() if v is not None and k != "model_options"}
+        record_id = filter_repository.create(uid=call.from_user.id, data=record)
 
-        thread_manager.start_threads(data_search={record_id: db[record_id]}, uid=call.from_user.id)
+        thread_manager.start_threads(data_search={record_id: record}, uid=call.from_user.id)
 
         text = (
             f"✅ <b>Your data has been successfully saved!</b>\n\n"
@@ -0,0 +1,74 @@
+from collections import OrderedDict
+
+from aiogram.types import InlineKeyboardMarkup
+
+from src.engine.catalog import catalog
+
+
+class KeyboardCache:
+    """
+    Готовые разметки клавиатур каталога по ключу (вид, url марки, страница).
+    Весь кэш сбрасывается, когда в каталоге меняются данные, так что ключ
+    действует в пределах версии каталога; пользовательские отметки накладываются
+    поверх копии разметки в patch/mark. Без ключа разметка строится заново.
+    """
+
+    def __init__(self, maxsize: int = 1024) -> None:
+        self.maxsize = maxsize
+        self.version = catalog.version
+        self.markups: OrderedDict[tuple, InlineKeyboardMarkup] = OrderedDict()
+        self.stats = {"hits": 0, "builds": 0}
+
+
+    def get(self, key: tuple | None, build) -> InlineKeyboardMarkup:
+        if key is None:
+            return build()
+
+        if self.version != catalog.version:
+            self.markups.clear()
+            self.version = catalog.version
+
+        markup = self.markups.get(key)
+        if markup is not None:
+            self.markups.move_to_end(key)
+            self.stats["hits"] += 1
+            return markup
+
+        markup = build()
+        self.markups[key] = markup
+        self.stats["builds"] += 1
+        if len(self.markups) > self.maxsize:
+            self.markups.popitem(last=False)
+
+        return markup
+
+
+def patch(markup: InlineKeyboardMarkup, text) -> InlineKeyboardMarkup:
+    """
+    Копия разметки, где text(button) вернул новый текст; кэшированная разметка не меняется
+    """
+
+    rows, changed = [], False
+    for row in markup.inline_keyboard:
+        new_row = []
+        for button in row:
+            new_text = text(button)
+            if new_text is None:
+                new_row.append(button)
+            else:
+                new_row.append(button.model_copy(update={"text": new_text}))
+                changed = True
+        rows.append(new_row)
+
+    return markup.model_copy(update={"inline_keyboard": rows}) if changed else markup
+
+
+def mark(markup: InlineKeyboardMarkup, selected) -> InlineKeyboardMarkup:
+    if not selected:
+        return markup
+
+    selected = {selected} if isinstance(selected, str) else set(selected)
+    return patch(markup, lambda button: f'• {button.text}' if button.text in selected else None)
+
+
+keyboards = KeyboardCache()
@@ -4,13 +4,17 @@ from aiogram.filters.callback_data import CallbackData
 
 class CarsCallback(CallbackData, prefix="cars"):
     action: str
-    name_car: Optional[str]
-    url_car: Optional[str]
+    car_id: Optional[str]
 
 
 class ModelsCallback(CallbackData, prefix="models"):
     action: str
-    model: Optional[str]
+    model_id: Optional[str]
+
+
+class PageCallback(CallbackData, prefix="page"):
+    menu: str
+    page: int
 
 
 class YearsCallback(CallbackData, prefix="years"):
@@ -0,0 +1,55 @@
+import json
+import base64
+import hashlib
+import threading
+
+
+class ShortIds:
+    """
+    Короткие id для callback data вместо полных названий и URL.
+    id детерминирован (хэш значения), поэтому после рестарта та же кнопка
+    снова разрешается, как только значение заново попало в таблицу.
+    """
+
+    def __init__(self, digest_size: int = 6) -> None:
+        self.digest_size = digest_size
+        self.lock = threading.Lock()
+        self.values: dict[str, object] = {}
+
+
+    def _make(self, raw: bytes, digest_size: int) -> str:
+        digest = hashlib.blake2b(raw, digest_size=digest_size).digest()
+        return base64.urlsafe_b64encode(digest).decode().rstrip("=")
+
+
+    def intern(self, value) -> str:
+        raw = json.dumps(value, ensure_ascii=False).encode("utf-8")
+        short_id = self._make(raw, self.digest_size)
+
+        with self.lock:
+            current = self.values.setdefault(short_id, value)
+            if current != value:
+                short_id = self._make(raw, self.digest_size * 2)
+                self.values[short_id] = value
+
+        return short_id
+
+
+    def resolve(self, short_id: str | None, candidates=()):
+        """
+        Значение по id; если таблица его не знает, кандидаты интернируются и поиск повторяется
+        """
+
+        if short_id is None:
+            return None
+
+        value = self.values.get(short_id)
+        if value is None:
+            for candidate in candidates:
+                if self.intern(candidate) == short_id:
+                    return candidate
+
+        return value
+
+
+short_ids = ShortIds()
@@ -2,9 +2,30 @@ from aiogram.types import InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
 from src.keyboards.callbackdata import *
+from src.keyboards.cache import keyboards, mark
+from src.keyboards.ids import short_ids
 from manager import thread_manager
 
 
+PAGE_SIZE = 24
+
+
+def paginate(items: list, page: int) -> tuple[list, int, int]:
+    pages = max(1, -(-len(items) // PAGE_SIZE))
+    page = min(max(page, 0), pages - 1)
+    return items[page * PAGE_SIZE:(page + 1) * PAGE_SIZE], page, pages
+
+
+def page_row(menu: str, page: int, pages: int) -> list[InlineKeyboardButton]:
+    row = []
+    if page > 0:
+        row.append(InlineKeyboardButton(text="◀️", callback_data=PageCallback(menu=menu, page=page - 1).pack()))
+    row.append(InlineKeyboardButton(text=f"{page + 1}/{pages}", callback_data="noop"))
+    if page < pages - 1:
+        row.append(InlineKeyboardButton(text="▶️", callback_data=PageCallback(menu=menu, page=page + 1).pack()))
+    return row
+
+
 class Ikb:
     @staticmethod
     async def main_menu() -> InlineKeyboardBuilder:
@@ -17,109 +38,139 @@ class Ikb:
 
 
     @staticmethod
-    async def cars_buttons_menu(list_cars: list[dict]) -> InlineKeyboardBuilder:
-        menu = InlineKeyboardBuilder()
+    async def cars_buttons_menu(list_cars: list[dict], page: int = 0) -> InlineKeyboardBuilder:
+        cars, page, pages = paginate(list_cars, page)
 
-        for data_car in list_cars:
-            menu.button(text=data_car.get('car', None), callback_data=CarsCallback(action='car', name_car=data_car.get('car', None), url_car=data_car.get('url', None)))
+        def build():
+            menu = InlineKeyboardBuilder()
 
-        return menu.adjust(3).as_markup()
+            for data_car in cars:
+                car_id = short_ids.intern((data_car.get('car'), data_car.get('url')))
+                menu.button(text=data_car.get('car', None), callback_data=CarsCallback(action='car', car_id=car_id))
+
+            menu.adjust(3)
+            if pages > 1:
+                menu.row(*page_row("cars", page, pages))
+
+            return menu.as_markup()
+
+        return keyboards.get(("cars", page), build)
 
     
     @staticmethod
-    async def models_buttons_menu(models: list[str]) -> InlineKeyboardBuilder:
-        menu = InlineKeyboardBuilder()
+    async def models_buttons_menu(models: list[str], url: str, page: int = 0) -> InlineKeyboardBuilder:
+        models, page, pages = paginate(models, page)
 
-        for model in models:
-            menu.button(text=model, callback_data=ModelsCallback(action='car_models', model=model))
+        def build():
+            menu = InlineKeyboardBuilder()
 
-        menu.adjust(3)
-        menu.row(InlineKeyboardButton(text="Skip >>", callback_data=ModelsCallback(action='car_models', model=None).pack()))
+            for model in models:
+                menu.button(text=model, callback_data=ModelsCallback(action='car_models', model_id=short_ids.intern(model)))
 
-        return menu.as_markup()
+            menu.adjust(3)
+            if pages > 1:
+                menu.row(*page_row("models", page, pages))
+            menu.row(InlineKeyboardButton(text="Skip >>", callback_data=ModelsCallback(action='car_models', model_id=None).pack()))
+
+            return menu.as_markup()
+
+        return keyboards.get(("models", url, page), build)
 
     
     @staticmethod
-    async def years_buttons_menu(years: list[str], action: str) -> InlineKeyboardBuilder:
-        menu = InlineKeyboardBuilder()
+    async def years_buttons_menu(years: list[str], action: str, url: str | None = None) -> InlineKeyboardBuilder:
+        def build():
+            menu = InlineKeyboardBuilder()
 
-        for year in years:
-            menu.button(text=year, callback_data=YearsCallback(action=action, year=year))
+            for year in years:
+                menu.button(text=year, callback_data=YearsCallback(action=action, year=year))
 
-        menu.adjust(3)
-        menu.row(InlineKeyboardButton(text="Skip >>", callback_data=YearsCallback(action=action, year=None).pack()))
+            menu.adjust(3)
+            menu.row(InlineKeyboardButton(text="Skip >>", callback_data=YearsCallback(action=action, year=None).pack()))
 
-        return menu.as_markup()
+            return menu.as_markup()
+
+        return keyboards.get(("years", url, action) if url else None, build)
 
     
     @staticmethod
-    async def displacement_buttons_menu(displacements: list[str], action: str) -> InlineKeyboardBuilder:
-        menu = InlineKeyboardBuilder()
+    async def displacement_buttons_menu(displacements: list[str], action: str, url: str | None = None) -> InlineKeyboardBuilder:
+        def build():
+            menu = InlineKeyboardBuilder()
 
-        for displacement in displacements:
-            menu.button(text=displacement, callback_data=DisplacementCallback(action=action, displacement=displacement))
+            for displacement in displacements:
+                menu.button(text=displacement, callback_data=DisplacementCallback(action=action, displacement=displacement))
 
-        menu.adjust(2)
-        menu.row(InlineKeyboardButton(text="Skip >>", callback_data=DisplacementCallback(action=action, displacement=None).pack()))
+            menu.adjust(2)
+            menu.row(InlineKeyboardButton(text="Skip >>", callback_data=DisplacementCallback(action=action, displacement=None).pack()))
 
-        return menu.as_markup()
+            return menu.as_markup()
+
+        return keyboards.get(("displacements", url, action) if url else None, build)
     
 
     @staticmethod
-    async def typengine_buttons_menu(typengines: list[str], selected_typengines: list[str] | None) -> InlineKeyboardBuilder:
-        menu = InlineKeyboardBuilder()
+    async def typengine_buttons_menu(typengines: list[str], url: str, selected_typengines: list[str] | None) -> InlineKeyboardBuilder:
+        def build():
+            menu = InlineKeyboardBuilder()
 
-        for typengine in typengines:
-            selected = typengine in (selected_typengines or [])
-            text = f'• {typengine}' if selected else typengine
+            for typengine in typengines:
+                menu.button(text=typengine, callback_data=TypengineCallback(action="typengine", typengine=typengine))
 
-            menu.button(text=text, callback_data=TypengineCallback(action="typengine", typengine=typengine, selected=selected))
+            menu.adjust(2)
+            menu.row(InlineKeyboardButton(text="Next >", callback_data=TypengineCallback(action="typengine", typengine=None).pack()))
 
-        menu.adjust(2)
-        menu.row(InlineKeyboardButton(text="Next >", callback_data=TypengineCallback(action="typengine", typengine=None).pack()))
+            return menu.as_markup()
 
-        return menu.as_markup()
+        return mark(keyboards.get(("typengines", url), build), selected_typengines)
 
     
     @staticmethod
-    async def gerabox_buttons_menu(geraboxes: list[str]) -> InlineKeyboardBuilder:
-        menu = InlineKeyboardBuilder()
+    async def gerabox_buttons_menu(geraboxes: list[str], url: str) -> InlineKeyboardBuilder:
+        def build():
+            menu = InlineKeyboardBuilder()
 
-        for gearbox in geraboxes:
-            menu.button(text=gearbox, callback_data=GearboxCallback(action="gearbox", gearbox=gearbox))
+            for gearbox in geraboxes:
+                menu.button(text=gearbox, callback_data=GearboxCallback(action="gearbox", gearbox=gearbox))
 
-        menu.adjust(2)
-        menu.row(InlineKeyboardButton(text="Skip >>", callback_data=GearboxCallback(action="gearbox", gearbox=None).pack()))
+            menu.adjust(2)
+            menu.row(InlineKeyboardButton(text="Skip >>", callback_data=GearboxCallback(action="gearbox", gearbox=None).pack()))
 
-        return menu.as_markup()
+            return menu.as_markup()
+
+        return keyboards.get(("gearbox", url), build)
 
     
     @staticmethod
-    async def bodytype_buttons_menu(bodytypes: list[str], selected_bodytypes: list[str] | None) -> InlineKeyboardBuilder:
-        menu = InlineKeyboardBuilder()
+    async def bodytype_buttons_menu(bodytypes: list[str], url: str, selected_bodytypes: list[str] | None) -> InlineKeyboardBuilder:
+        def build():
+            menu = InlineKeyboardBuilder()
 
-        for bodytype in bodytypes:
-            selected = bodytype in (selected_bodytypes or [])
-            text = f'• {bodytype}' if selected else bodytype
-            menu.button(text=text, callback_data=BodytypeCallback(action="bodytype", bodytype=bodytype))
+            for bodytype in bodytypes:
+                menu.button(text=bodytype, callback_data=BodytypeCallback(action="bodytype", bodytype=bodytype))
 
-        menu.adjust(2)
-        menu.row(InlineKeyboardButton(text="Next >", callback_data=BodytypeCallback(action="bodytype", bodytype=None).pack()))
+            menu.adjust(2)
+            menu.row(InlineKeyboardButton(text="Next >", callback_data=BodytypeCallback(action="bodytype", bodytype=None).pack()))
 
-        return menu.as_markup()
+            return menu.as_markup()
+
+        return mark(keyboards.get(("bodytypes", url), build), selected_bodytypes)
     
 
     @staticmethod
-    async def inspection_buttons_menu(inspections: list[str]) -> InlineKeyboardBuilder:
-        menu = InlineKeyboardBuilder()
+    async def inspection_buttons_menu(inspections: list[str], url: str) -> InlineKeyboardBuilder:
+        def build():
+            menu = InlineKeyboardBuilder()
 
-        for inspection in inspections:
-            menu.button(text=inspection, callback_data=InspectionCallback(action="inspection", inspection=inspection))
+            for inspection in inspections:
+                menu.button(text=inspection, callback_data=InspectionCallback(action="inspection", inspection=inspection))
 
-        menu.adjust(2)
-        menu.row(InlineKeyboardButton(text="Skip >>", callback_data=InspectionCallback(action="inspection", inspection=None).pack()))
+            menu.adjust(2)
+            menu.row(InlineKeyboardButton(text="Skip >>", callback_data=InspectionCallback(action="inspection", inspection=None).pack()))
 
-        return menu.as_markup()
+            return menu.as_markup()
+
+        return keyboards.get(("inspection", url), build)
 
     
     @staticmethod
@@ -135,10 +186,10 @@ class Ikb:
     @staticmethod
     async def filters_menu(filters: tuple[str, str, str], uid: int) -> InlineKeyboardBuilder:
         menu = InlineKeyboardBuilder()
+        active = thread_manager.get_active_filters(uid=uid)
 
         for filter_id, car, car_model in filters:
-            emoji = '🔴' if filter_id not in thread_manager.get_active_filters(uid=uid) else '🟢'
-
+            emoji = '🟢' if filter_id in active else '🔴'
             text = f'{emoji} {car} [{car_model}]' if car_model else f'{emoji} {car}'
             menu.button(text=text, callback_data=FiltersCallback(action="filter", filter_id=filter_id))
 
@@ -187,7 +238,8 @@ class Ikb:
 
     
     @staticmethod
-    async def models_buttons_edit_menu(models: list[str], filter_id: str, current_model: str) -> InlineKeyboardBuilder:
+    async def models_buttons_edit_menu(models: list[str], filter_id: str, current_model: str, page: int = 0) -> InlineKeyboardBuilder:
+        models, page, pages = paginate(models, page)
         menu = InlineKeyboardBuilder()
 
         for model in models:
@@ -196,12 +248,14 @@ class Ikb:
             else:
                 text = model
 
-            menu.button(text=text, callback_data=ModelsCallback(action='edit_model', model=model))
+            menu.button(text=text, callback_data=ModelsCallback(action='edit_model', model_id=short_ids.intern(model)))
 
         menu.adjust(3)
-        
+        if pages > 1:
+            menu.row(*page_row("edit_models", page, pages))
+
         if current_model != 'No selected':
-            menu.row(InlineKeyboardButton(text="Remove ❌", callback_data=ModelsCallback(action='edit_model', model=None).pack()))
+            menu.row(InlineKeyboardButton(text="Remove ❌", callback_data=ModelsCallback(action='edit_model', model_id=None).pack()))
 
         menu.row(InlineKeyboardButton(text="Back edit menu >>", callback_data=FiltersCallback(action="back_edit_menu", filter_id=filter_id).pack()))
 
@@ -0,0 +1,241 @@
+import math
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.lock = threading.Lock()
+
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, "") for name in self.label_names)
+
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.values: dict[tuple, float] = {}
+
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+    def render(self) -> list[str]:
+        with self.lock:
+            items = list(self.values.items())
+        return [f"{self.name}{_labels(self.label_names, key)} {_number(value)}" for key, value in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        with self.lock:
+            self.values[self._key(labels)] = value
+
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self.values: dict[tuple, list] = {}
+
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+
+    def render(self) -> list[str]:
+        with self.lock:
+            items = [(key, list(counts), total, count) for key, (counts, total, count) in self.values.items()]
+
+        lines = []
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, value in zip(self.buckets, counts):
+                cumulative += value
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {count}")
+        return lines
+
+
+class LazyMetric(Metric):
+    """
+    Значение считается только в момент запроса /metrics: fn возвращает число
+    или словарь {кортеж значений меток: число}
+    """
+
+    def __init__(self, name: str, help: str, fn, kind: str = "gauge", labels: tuple[str, ...] = ()) -> None:
+        super().__init__(name, help, labels)
+        self.kind = kind
+        self.fn = fn
+
+
+    def render(self) -> list[str]:
+        try:
+            value = self.fn()
+        except Exception as e:
+            logging.warning(f"[Metrics] {self.name}: {e}")
+            return []
+
+        if not isinstance(value, dict):
+            value = {(): value}
+        return [f"{self.name}{_labels(self.label_names, key)} {_number(v)}" for key, v in value.items()]
+
+
+class MetricsRegistry:
+    """
+    Метрики процесса в текстовом формате Prometheus. Обычные метрики — это
+    инкремент под локом; всё, что уже считается в stats компонентов, отдаётся
+    ленивыми метриками и не стоит ничего, пока /metrics никто не запрашивает.
+    """
+
+    def __init__(self, prefix: str = "sscar_") -> None:
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.metrics: dict[str, Metric] = {}
+        self._server = None
+
+
+    def _register(self, metric: Metric) -> Metric:
+        with self.lock:
+            self.metrics[metric.name] = metric
+        return metric
+
+
+    def counter(self, name: str, help: str, labels: tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(self.prefix + name, help, labels))
+
+
+    def gauge(self, name: str, help: str, labels: tuple[str, ...] = ()) -> Gauge:
+        return self._register(Gauge(self.prefix + name, help, labels))
+
+
+    def histogram(self, name: str, help: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(self.prefix + name, help, labels, buckets))
+
+
+    def lazy(self, name: str, help: str, fn, kind: str = "gauge", labels: tuple[str, ...] = ()) -> LazyMetric:
+        return self._register(LazyMetric(self.prefix + name, help, fn, kind, labels))
+
+
+    def render(self) -> str:
+        with self.lock:
+            metrics = list(self.metrics.values())
+
+        lines = []
+        for metric in metrics:
+            samples = metric.render()
+            if samples:
+                lines.extend(metric.header())
+                lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+    def serve(self, port: int, host: str = "127.0.0.1") -> None:
+        """
+        GET /metrics в отдельном потоке; повторный вызов ничего не делает
+        """
+
+        if self._server is not None:
+            return
+
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            self._server = ThreadingHTTPServer((host, port), Handler)
+        except OSError as e:
+            logging.error(f"[Metrics] Порт {port} недоступен: {e}")
+            return
+
+        threading.Thread(target=self._server.serve_forever, name="Metrics", daemon=True).start()
+        logging.info(f"[Metrics] http://{host}:{port}/metrics")
+
+
+registry = MetricsRegistry()
+
+scrape_cycles = registry.counter("scrape_cycles_total", "Scrape cycles by result", ("result",))
+scrape_steps = registry.histogram("scrape_step_seconds", "Search/page load/form fill/click/parse timings", ("step",))
+detail_fetches = registry.histogram("detail_fetch_seconds", "Ad detail page fetch and parse time")
+ads_found = registry.counter("new_ads_total", "New ads found")
@@ -0,0 +1,120 @@
+import asyncio
+import threading
+
+import aiohttp
+
+from src.utils.metrics import registry
+
+
+class SessionPool:
+    """
+    Одна ClientSession с keep-alive коннектором на каждый event loop.
+    Бот и движок поиска живут в разных loop'ах, поэтому сессии разные,
+    но внутри loop'а все запросы к ss.com и Telegram идут через один пул соединений.
+    """
+
+    def __init__(self, limit: int = 100, limit_per_host: int = 20,
+                 ttl_dns_cache: int = 300, keepalive_timeout: float = 30.0,
+                 timeout: float = 30.0) -> None:
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.ttl_dns_cache = ttl_dns_cache
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = timeout
+
+        self.lock = threading.Lock()
+        self._sessions: dict[asyncio.AbstractEventLoop, aiohttp.ClientSession] = {}
+        self.stats = {"requests": 0, "connections_created": 0, "connections_reused": 0, "dns_cache_hits": 0}
+
+        registry.lazy(
+            "http_events_total", "Outgoing HTTP requests and connection pool events",
+            lambda: {(event,): value for event, value in self.stats.items()},
+            kind="counter", labels=("event",)
+        )
+
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        trace = aiohttp.TraceConfig()
+
+        async def on_request_start(session, ctx, params):
+            self.stats["requests"] += 1
+
+        async def on_connection_create_end(session, ctx, params):
+            self.stats["connections_created"] += 1
+
+        async def on_connection_reuseconn(session, ctx, params):
+            self.stats["connections_reused"] += 1
+
+        async def on_dns_cache_hit(session, ctx, params):
+            self.stats["dns_cache_hits"] += 1
+
+        trace.on_request_start.append(on_request_start)
+        trace.on_connection_create_end.append(on_connection_create_end)
+        trace.on_connection_reuseconn.append(on_connection_reuseconn)
+        trace.on_dns_cache_hit.append(on_dns_cache_hit)
+
+        return trace
+
+
+    def get(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+
+        with self.lock:
+            session = self._sessions.get(loop)
+            if session is None or session.closed:
+                connector = aiohttp.TCPConnector(
+                    limit=self.limit,
+                    limit_per_host=self.limit_per_host,
+                    ttl_dns_cache=self.ttl_dns_cache,
+                    keepalive_timeout=self.keepalive_timeout,
+                )
+                session = aiohttp.ClientSession(
+                    connector=connector,
+                    timeout=aiohttp.ClientTimeout(total=self.timeout),
+                    trace_configs=[self._trace_config()],
+                )
+                self._sessions[loop] = session
+
+        return session
+
+
+    def isolated(self) -> aiohttp.ClientSession:
+        """
+        Сессия со своими cookie поверх общего коннектора — для запросов,
+        которые держат состояние в cookie (отправка формы поиска)
+        """
+
+        shared = self.get()
+        return aiohttp.ClientSession(
+            connector=shared.connector,
+            connector_owner=False,
+            timeout=shared.timeout,
+            trace_configs=[self._trace_config()],
+        )
+
+
+    async def close(self) -> None:
+        loop = asyncio.get_running_loop()
+
+        with self.lock:
+            session = self._sessions.pop(loop, None)
+
+        if session and not session.closed:
+            await session.close()
+
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            open_sessions = sum(1 for s in self._sessions.values() if not s.closed)
+
+        created = self.stats["connections_created"]
+        reused = self.stats["connections_reused"]
+
+        return {
+            **self.stats,
+            "open_sessions": open_sessions,
+            "reuse_ratio": round(reused / (created + reused), 3) if created + reused else 0.0,
+        }
+
+
+http_pool = SessionPool()
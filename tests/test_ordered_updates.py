@@ -0,0 +1,81 @@
+import asyncio
+from datetime import datetime
+
+from aiogram import Bot, Dispatcher
+from aiogram.filters import StateFilter
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.types import Chat, Message, Update, User
+
+from src.core.middlewares import ChatEventIsolation, OrderedUpdatesMiddleware
+
+
+class Form(StatesGroup):
+    brand = State()
+
+
+def make_update(update_id: int, chat_id: int = 1, text: str = "x") -> Update:
+    user = User(id=chat_id, is_bot=False, first_name="u")
+    message = Message(
+        message_id=update_id, date=datetime.now(),
+        chat=Chat(id=chat_id, type="private"), from_user=user, text=text,
+    )
+    return Update(update_id=update_id, message=message)
+
+
+def make_dispatcher(routed: list, peaks: list | None = None, updates: OrderedUpdatesMiddleware | None = None) -> Dispatcher:
+    dp = Dispatcher(events_isolation=ChatEventIsolation())
+    updates = updates or OrderedUpdatesMiddleware(max_in_flight=8)
+    dp.update.outer_middleware(updates)
+
+    @dp.message(StateFilter(None))
+    async def start(message: Message, state: FSMContext) -> None:
+        routed.append((message.message_id, "start"))
+        if peaks is not None:
+            peaks.append(updates.in_flight)
+        await asyncio.sleep(0.05)
+        await state.set_state(Form.brand)
+
+    @dp.message(StateFilter(Form.brand))
+    async def brand(message: Message, state: FSMContext) -> None:
+        routed.append((message.message_id, "brand"))
+        await state.clear()
+
+    return dp
+
+
+async def feed(dp: Dispatcher, updates: list[Update]) -> None:
+    bot = Bot(token="42:TEST")
+    try:
+        await asyncio.gather(*(asyncio.create_task(dp.feed_update(bot, update)) for update in updates))
+    finally:
+        await bot.session.close()
+
+
+def test_state_dependent_routing_keeps_chat_order():
+    routed = []
+    dp = make_dispatcher(routed)
+
+    asyncio.run(feed(dp, [make_update(1), make_update(2), make_update(3)]))
+
+    assert routed == [(1, "start"), (2, "brand"), (3, "start")]
+
+
+def test_different_chats_run_concurrently():
+    routed, peaks = [], []
+    dp = make_dispatcher(routed, peaks)
+
+    asyncio.run(feed(dp, [make_update(1, chat_id=1), make_update(2, chat_id=2)]))
+
+    assert sorted(routed) == [(1, "start"), (2, "start")]
+    assert max(peaks) == 2
+
+
+def test_wait_includes_chat_lock():
+    routed = []
+    updates = OrderedUpdatesMiddleware(max_in_flight=8)
+    dp = make_dispatcher(routed, updates=updates)
+
+    asyncio.run(feed(dp, [make_update(1), make_update(2)]))
+
+    assert max(updates.waits) >= 0.04